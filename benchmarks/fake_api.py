@@ -0,0 +1,98 @@
+"""
+A local aiohttp server answering the endpoints ApiStore uses,
+so it can be benchmarked, HTTP and JSON included, offline.
+
+Conversations are kept in memory exactly as they were posted.
+"""
+import itertools
+from typing import Dict, List
+
+from aiohttp import web
+
+
+class FakeApiServer:
+    def __init__(self, *, helpers: List[int] = (), supports_batch: bool = True):
+        self.conversations: Dict[int, dict] = {}
+        self.helpers = list(helpers)
+        self.supports_batch = supports_batch
+
+        self._message_ids = itertools.count(1)
+        self._runner = None
+        self.url = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Starts serving, returning the base url to give ApiStore"""
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_post("/api/token/", self.token)
+        app.router.add_post("/api/token/validate/", self.ok)
+        app.router.add_post("/api/token/refresh/", self.token)
+        app.router.add_post("/api/conversation/create/", self.create)
+        if self.supports_batch:
+            app.router.add_post("/api/conversation/create/batch/", self.create_batch)
+        app.router.add_get("/api/conversation/get/all/", self.get_all)
+        app.router.add_get("/api/conversation/count/", self.count)
+        app.router.add_get("/api/helper/get/all/", self.get_helpers)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/api/"
+        return self.url
+
+    async def stop(self) -> None:
+        await self._runner.cleanup()
+
+    async def token(self, request: web.Request) -> web.Response:
+        return web.json_response({"access": "access", "refresh": "refresh"})
+
+    async def ok(self, request: web.Request) -> web.Response:
+        return web.json_response({})
+
+    async def create(self, request: web.Request) -> web.Response:
+        self._store(await request.json())
+        return web.json_response({}, status=201)
+
+    async def create_batch(self, request: web.Request) -> web.Response:
+        for conversation in await request.json():
+            self._store(conversation)
+
+        return web.json_response({}, status=201)
+
+    async def get_all(self, request: web.Request) -> web.Response:
+        after = int(request.query.get("after", -1))
+        limit = int(request.query.get("limit", len(self.conversations) or 1))
+        page = [
+            self.conversations[identifier]
+            for identifier in sorted(self.conversations)
+            if identifier > after
+        ][:limit]
+        return web.json_response(page)
+
+    async def count(self, request: web.Request) -> web.Response:
+        return web.json_response({"conversation_count": len(self.conversations)})
+
+    async def get_helpers(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            [
+                {
+                    "identifier": helper,
+                    "total_messages": 0,
+                    "total_conversations": 0,
+                    "messages_per_conversation": [],
+                    "conversation_length": [],
+                }
+                for helper in self.helpers
+            ]
+        )
+
+    def _store(self, conversation: dict) -> None:
+        # Shaped like the Django serializer's output
+        conversation["id"] = conversation.pop("identifier")
+        for message in conversation["messages"]:
+            message["id"] = next(self._message_ids)
+            message["conversation"] = conversation["id"]
+
+        self.conversations[conversation["id"]] = conversation
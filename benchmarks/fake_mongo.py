@@ -0,0 +1,250 @@
+"""
+An in-process stand-in for the slice of motor's API which the
+Mongo datastore uses, so it can be benchmarked without a server.
+
+Documents are deep copied on the way in and out, roughly like a
+BSON round trip, but there are no indexes and every lookup is a
+scan. Numbers from this measure the datastore's own overhead,
+not what a real deployment would see.
+"""
+import copy
+import itertools
+from typing import Any, Dict, List, Optional
+
+from pymongo import DeleteMany
+from pymongo.errors import OperationFailure
+
+from conversations.datastore import Mongo
+from conversations.datastore.mongo.document import Document
+
+
+def fake_mongo_datastore(**kwargs) -> Mongo:
+    """A Mongo datastore backed by a fresh FakeClient"""
+    datastore = Mongo("mongodb://localhost", **kwargs)
+    datastore.client.close()
+
+    datastore.client = FakeClient()
+    datastore.db = datastore.client.stats
+    datastore.conversations = Document(datastore.db, "conversations")
+    datastore.helpers = Document(datastore.db, "helpers")
+    datastore.checkpoints = Document(datastore.db, "checkpoints")
+    datastore.counters = Document(datastore.db, "counters")
+    return datastore
+
+
+class FakeClient:
+    def __init__(self):
+        self._databases: Dict[str, FakeDatabase] = {}
+
+    def __getitem__(self, name: str) -> "FakeDatabase":
+        return self._databases.setdefault(name, FakeDatabase())
+
+    def __getattr__(self, name: str) -> "FakeDatabase":
+        return self[name]
+
+    async def start_session(self):
+        # Like a standalone server, which can't do transactions
+        raise OperationFailure("Transactions need a replica set", code=20)
+
+    def close(self) -> None:
+        pass
+
+
+class FakeDatabase:
+    def __init__(self):
+        self._collections: Dict[str, FakeCollection] = {}
+
+    def __getitem__(self, name: str) -> "FakeCollection":
+        return self._collections.setdefault(name, FakeCollection())
+
+
+class FakeCollection:
+    _ids = itertools.count(1)
+
+    def __init__(self):
+        self.documents: List[dict] = []
+        # Only recorded, lookups still scan
+        self.indexes: Dict[str, dict] = {"_id_": {"key": [("_id", 1)]}}
+
+    def find(self, filter_dict=None, projection=None, **_) -> "FakeCursor":
+        matches = [d for d in self.documents if _matches(d, filter_dict or {})]
+        return FakeCursor(matches, projection)
+
+    async def find_one(self, filter_dict, sort=None) -> Optional[dict]:
+        documents = self.documents
+        for key, direction in reversed(sort or []):
+            documents = sorted(documents, key=lambda d: d[key], reverse=direction < 0)
+
+        for document in documents:
+            if _matches(document, filter_dict):
+                return copy.deepcopy(document)
+
+        return None
+
+    async def insert_one(self, document: dict) -> None:
+        document = copy.deepcopy(document)
+        document.setdefault("_id", next(self._ids))
+        self.documents.append(document)
+
+    async def update_one(self, filter_dict, update, upsert=False, session=None):
+        for document in self.documents:
+            if _matches(document, filter_dict):
+                _apply(document, update)
+                return
+
+        if upsert:
+            document = {
+                key: value
+                for key, value in filter_dict.items()
+                if not isinstance(value, dict)
+            }
+            _apply(document, update)
+            document.update(copy.deepcopy(update.get("$setOnInsert", {})))
+            await self.insert_one(document)
+
+    async def bulk_write(self, operations, ordered=True, session=None) -> None:
+        for operation in operations:
+            if isinstance(operation, DeleteMany):
+                await self.delete_many(operation._filter)
+            else:
+                await self.update_one(
+                    operation._filter, operation._doc, upsert=operation._upsert
+                )
+
+    def aggregate(self, pipeline, **_) -> "FakeCursor":
+        """Only $match, and $group with $min and $sum, are understood"""
+        documents = [copy.deepcopy(d) for d in self.documents]
+        for stage in pipeline:
+            if "$match" in stage:
+                documents = [d for d in documents if _matches(d, stage["$match"])]
+            else:
+                documents = _group(documents, stage["$group"])
+
+        return FakeCursor(documents, None)
+
+    async def delete_many(self, filter_dict) -> None:
+        self.documents = [d for d in self.documents if not _matches(d, filter_dict)]
+
+    async def count_documents(self, filter_dict) -> int:
+        return sum(1 for d in self.documents if _matches(d, filter_dict))
+
+    async def create_index(self, keys, **_) -> None:
+        name = "_".join(f"{key}_{direction}" for key, direction in keys)
+        self.indexes[name] = {"key": keys}
+
+    async def index_information(self) -> Dict[str, dict]:
+        return dict(self.indexes)
+
+
+class FakeCursor:
+    def __init__(self, documents: List[dict], projection: Optional[dict]):
+        self.documents = documents
+        self.projection = projection
+
+    def sort(self, key: str, direction: int) -> "FakeCursor":
+        self.documents = sorted(
+            self.documents, key=lambda d: d[key], reverse=direction < 0
+        )
+        return self
+
+    async def to_list(self, length: Optional[int]) -> List[dict]:
+        return [self._copy(d) for d in self.documents[:length]]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield self._copy(document)
+
+    def _copy(self, document: dict) -> dict:
+        if not self.projection:
+            return copy.deepcopy(document)
+
+        return _project(document, self.projection)
+
+
+def _matches(document: dict, filter_dict: dict) -> bool:
+    for key, expected in filter_dict.items():
+        value = document.get(key)
+        if isinstance(expected, dict):
+            for operator, operand in expected.items():
+                if operator == "$ne":
+                    # Like mongo, a missing field or an array without it matches
+                    if value == operand or (
+                        isinstance(value, list) and operand in value
+                    ):
+                        return False
+                elif value is None or not OPERATORS[operator](value, operand):
+                    return False
+        elif value != expected:
+            return False
+
+    return True
+
+
+OPERATORS = {
+    "$gte": lambda value, operand: value >= operand,
+    "$gt": lambda value, operand: value > operand,
+    "$lte": lambda value, operand: value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$lt": lambda value, operand: value < operand,
+}
+
+
+def _group(documents: List[dict], spec: dict) -> List[dict]:
+    groups: Dict[Any, dict] = {}
+    for document in documents:
+        key = document.get(spec["_id"].lstrip("$"))
+        group = groups.setdefault(key, {"_id": key})
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+
+            operator, operand = next(iter(accumulator.items()))
+            if operator == "$sum":
+                group[field] = group.get(field, 0) + operand
+            else:
+                value = document.get(operand.lstrip("$"))
+                group[field] = min(group.get(field, value), value)
+
+    return list(groups.values())
+
+
+def _apply(document: dict, update: dict) -> None:
+    for key, value in update.get("$set", {}).items():
+        document[key] = copy.deepcopy(value)
+
+    for key, amount in update.get("$inc", {}).items():
+        document[key] = document.get(key, 0) + amount
+
+    for key, value in update.get("$push", {}).items():
+        items = value["$each"] if isinstance(value, dict) else [value]
+        document.setdefault(key, []).extend(copy.deepcopy(items))
+        if isinstance(value, dict) and "$slice" in value:
+            document[key] = document[key][value["$slice"] :]
+
+
+def _project(document: dict, projection: dict) -> dict:
+    """Applies an inclusion projection, with dotted paths into arrays"""
+    result: Dict[str, Any] = {}
+    if projection.get("_id", 1):
+        result["_id"] = document["_id"]
+
+    for path, include in projection.items():
+        if path == "_id" or not include:
+            continue
+
+        field, _, rest = path.partition(".")
+        if field not in document:
+            continue
+        if not rest:
+            result[field] = copy.deepcopy(document[field])
+            continue
+
+        items = result.setdefault(field, [{} for _ in document[field]])
+        for item, source in zip(items, document[field]):
+            if rest in source:
+                item[rest] = copy.deepcopy(source[rest])
+
+    return result
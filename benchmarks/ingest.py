@@ -0,0 +1,209 @@
+"""
+Drives Manager.build_past_conversations and the read paths of every
+datastore backend against a synthetic channel history, offline.
+
+Mongo runs against an in-process stand-in and ApiStore against a local
+fake server, see fake_mongo and fake_api. Each backend runs in its own
+process so peak RSS is measured per backend.
+
+Usage: python -m benchmarks.ingest [--backends sqlite mongo api] [--messages N]
+       [--helper-ratio R] [--conversation-length N] [--shards N] [--seed N]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import attr
+import numpy as np
+
+from benchmarks.fake_api import FakeApiServer
+from benchmarks.fake_mongo import fake_mongo_datastore
+from benchmarks.synthetic import HistoryShape, SyntheticChannel
+from conversations import Helper, Manager
+from conversations.datastore import ApiStore, Sqlite
+
+BACKENDS = ("sqlite", "mongo", "api")
+
+
+@attr.s(slots=True, frozen=True)
+class StageResult:
+    stage: str = attr.ib()
+    messages: int = attr.ib()
+    seconds: float = attr.ib()
+    # Per call latencies, in seconds
+    latencies: Tuple[float, ...] = attr.ib()
+    # History requests made, for the ingest stage
+    pages: int = attr.ib(default=0)
+
+    def messages_per_second(self) -> float:
+        return self.messages / self.seconds if self.seconds else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """A latency percentile in milliseconds"""
+        if not self.latencies:
+            return 0.0
+
+        return float(np.percentile(self.latencies, percent)) * 1000
+
+
+def timed(latencies: List[float], function):
+    """Wraps a coroutine function to record how long each call takes"""
+
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    return wrapper
+
+
+async def open_datastore(backend: str, channel: SyntheticChannel, directory: str):
+    """Returns an opened datastore, knowing the channel's helpers, and a cleanup"""
+    if backend == "sqlite":
+        datastore = Sqlite(os.path.join(directory, "benchmark.db"))
+        await datastore.open()
+        for helper_id in channel.helper_ids:
+            await datastore.store_helper(Helper(helper_id))
+
+        return datastore, datastore.close
+
+    if backend == "mongo":
+        datastore = fake_mongo_datastore()
+        for helper_id in channel.helper_ids:
+            await datastore.store_helper(Helper(helper_id))
+
+        return datastore, datastore.close
+
+    server = FakeApiServer(helpers=channel.helper_ids)
+    datastore = ApiStore()
+    datastore.base_url = await server.start()
+
+    async def close():
+        await datastore.close()
+        await server.stop()
+
+    return datastore, close
+
+
+async def run_backend(backend: str, shape: HistoryShape, shards: int) -> List[StageResult]:
+    channel = SyntheticChannel(shape)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        datastore, close = await open_datastore(backend, channel, directory)
+        try:
+            write_latencies: List[float] = []
+            datastore.save_conversations = timed(
+                write_latencies, datastore.save_conversations
+            )
+
+            manager = Manager(datastore)
+            manager.backfill_shards = shards
+            started = time.perf_counter()
+            stats = await manager.build_past_conversations(channel)
+            results.append(
+                StageResult(
+                    "ingest",
+                    stats.messages_fetched,
+                    time.perf_counter() - started,
+                    tuple(write_latencies),
+                    pages=channel.pages_fetched,
+                )
+            )
+
+            read_latencies = []
+            messages = 0
+            started = last = time.perf_counter()
+            async for conversation in datastore.iter_conversations():
+                now = time.perf_counter()
+                read_latencies.append(now - last)
+                last = now
+                messages += len(conversation.messages)
+
+            results.append(
+                StageResult(
+                    "iter_conversations",
+                    messages,
+                    time.perf_counter() - started,
+                    tuple(read_latencies),
+                )
+            )
+
+            started = time.perf_counter()
+            batch = await datastore.fetch_conversation_batch()
+            elapsed = time.perf_counter() - started
+            results.append(
+                StageResult(
+                    "fetch_conversation_batch",
+                    batch.message_count,
+                    elapsed,
+                    (elapsed,),
+                )
+            )
+        finally:
+            await close()
+
+    return results
+
+
+def _worker(backend: str, shape: HistoryShape, shards: int, queue) -> None:
+    results = asyncio.run(run_backend(backend, shape, shards))
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((results, peak_rss))
+
+
+def report(backend: str, results: List[StageResult], peak_rss: float) -> None:
+    print(f"{backend} (peak RSS {peak_rss:.1f} MiB)")
+    for result in results:
+        print(
+            f"  {result.stage:<26}"
+            f"{result.messages_per_second():>12,.0f} msgs/s"
+            f"  p50 {result.percentile(50):>9.3f} ms"
+            f"  p99 {result.percentile(99):>9.3f} ms"
+            f"  ({result.messages:,} messages in {result.seconds:.2f}s"
+            + (f", {result.pages:,} pages)" if result.pages else ")")
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--helpers", type=int, default=8)
+    parser.add_argument("--helper-ratio", type=float, default=0.4)
+    parser.add_argument("--conversation-length", type=float, default=10)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    shape = HistoryShape(
+        messages=args.messages,
+        helpers=args.helpers,
+        helper_ratio=args.helper_ratio,
+        mean_conversation_length=args.conversation_length,
+        seed=args.seed,
+    )
+    context = multiprocessing.get_context("spawn")
+    results: Dict[str, Tuple[List[StageResult], float]] = {}
+    for backend in args.backends:
+        queue = context.Queue()
+        process = context.Process(
+            target=_worker, args=(backend, shape, args.shards, queue)
+        )
+        process.start()
+        results[backend] = queue.get()
+        process.join()
+
+    for backend, (stages, peak_rss) in results.items():
+        report(backend, stages, peak_rss)
+
+
+if __name__ == "__main__":
+    main()
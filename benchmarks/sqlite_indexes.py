@@ -0,0 +1,126 @@
+"""
+Compares query plans and timings of the Sqlite datastore's hot
+lookups with only the base schema applied (before) and with every
+migration applied (after).
+
+Usage: python -m benchmarks.sqlite_indexes [--conversations N] [--messages N]
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import tempfile
+import timeit
+
+from conversations.datastore import Sqlite
+from conversations.datastore.sqlite.migrations import MIGRATIONS
+
+QUERIES = {
+    "messages in a conversation": (
+        "SELECT * FROM Message WHERE conversation_id = :conversation_id"
+    ),
+    "author messages in a time range": (
+        "SELECT * FROM Message "
+        "WHERE author_id = :author_id AND timestamp BETWEEN :start AND :end"
+    ),
+    "conversations in a time range": (
+        "SELECT * FROM Conversation WHERE start_time BETWEEN :start AND :end"
+    ),
+}
+
+
+def to_column(value: datetime.datetime, version: int):
+    """Timestamps are TEXT before schema version 3 and epoch microseconds after"""
+    if version >= 3:
+        return Sqlite._convert_to_epoch(value)
+
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def build_database(path: str, version: int, conversations: int, messages: int):
+    db = sqlite3.connect(path)
+    for number, script in enumerate(MIGRATIONS[:version], start=1):
+        db.executescript(f"{script}\nPRAGMA user_version = {number};")
+
+    rng = random.Random(0)
+    start = datetime.datetime(2020, 1, 1)
+    message_id = 0
+    conversation_rows = []
+    message_rows = []
+    for identifier in range(conversations):
+        began = start + datetime.timedelta(minutes=identifier * 30)
+        helpee = rng.randrange(10_000)
+        for offset in range(messages):
+            message_id += 1
+            author = helpee if offset % 2 == 0 else rng.randrange(10)
+            sent = to_column(began + datetime.timedelta(minutes=offset), version)
+            message_rows.append(
+                (message_id, author, 1, 1, int(author < 10), "x" * 40, sent, identifier)
+            )
+
+        conversation_rows.append(
+            (
+                identifier,
+                message_id - messages + 1,
+                message_id,
+                helpee,
+                to_column(began, version),
+                to_column(began + datetime.timedelta(minutes=messages), version),
+                1,
+                1,
+                None,
+            )
+        )
+
+    db.executemany(
+        "INSERT INTO Conversation (identifier, first_message_id, last_message_id, "
+        "  user_being_helped, start_time, end_time, guild_id, channel_id, topic) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        conversation_rows,
+    )
+    db.executemany(
+        "INSERT INTO Message VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        message_rows,
+    )
+    db.commit()
+    db.execute("ANALYZE")
+    return db
+
+
+def report(db: sqlite3.Connection, version: int, conversations: int, repeat: int):
+    args = {
+        "conversation_id": conversations // 2,
+        "author_id": 3,
+        "start": to_column(datetime.datetime(2020, 3, 1), version),
+        "end": to_column(datetime.datetime(2020, 3, 8), version),
+    }
+    for name, query in QUERIES.items():
+        plan = db.execute(f"EXPLAIN QUERY PLAN {query}", args).fetchall()
+        elapsed = timeit.timeit(
+            lambda: db.execute(query, args).fetchall(), number=repeat
+        )
+        print(f"  {name}")
+        for row in plan:
+            print(f"    plan: {row[-1]}")
+        print(f"    {elapsed / repeat * 1000:.3f} ms per query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=20_000)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for label, version in (("before", 1), ("after", len(MIGRATIONS))):
+            path = os.path.join(directory, f"{label}.db")
+            db = build_database(path, version, args.conversations, args.messages)
+            print(f"{label} (schema version {version})")
+            report(db, version, args.conversations, args.repeat)
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
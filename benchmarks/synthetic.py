@@ -0,0 +1,166 @@
+"""
+Synthetic Discord channel history, shaped enough like discord.py's
+objects for the Segmenter and Manager to consume offline.
+"""
+import bisect
+import datetime
+import random
+from typing import AsyncIterator, List, Optional
+
+import attr
+import discord
+
+
+@attr.s(slots=True, frozen=True)
+class FakeUser:
+    id: int = attr.ib()
+    bot: bool = attr.ib(default=False)
+
+
+@attr.s(slots=True, frozen=True)
+class FakeObject:
+    id: int = attr.ib()
+
+
+@attr.s(slots=True, frozen=True)
+class FakeMessage:
+    id: int = attr.ib()
+    author: FakeUser = attr.ib()
+    content: str = attr.ib()
+    channel: FakeObject = attr.ib()
+    guild: FakeObject = attr.ib()
+    created_at: datetime.datetime = attr.ib()
+
+    @property
+    def clean_content(self) -> str:
+        return self.content
+
+
+@attr.s(slots=True, frozen=True)
+class HistoryShape:
+    """What a generated history looks like"""
+
+    messages: int = attr.ib(default=100_000)
+    helpers: int = attr.ib(default=8)
+    # Chance any message after a conversation's first is from a helper
+    helper_ratio: float = attr.ib(default=0.4)
+    # Conversation lengths in messages are geometric with this mean
+    mean_conversation_length: float = attr.ib(default=10)
+    # Mean gaps in seconds, exponentially distributed
+    mean_message_gap: float = attr.ib(default=90)
+    mean_conversation_gap: float = attr.ib(default=1200)
+    bot_ratio: float = attr.ib(default=0.01)
+    content_length: int = attr.ib(default=80)
+    seed: int = attr.ib(default=0)
+
+
+class SyntheticChannel:
+    """A text channel whose history is generated up front from a HistoryShape"""
+
+    HELPER_IDS_START = 1_000
+    HELPEE_IDS_START = 1_000_000
+    # Messages per history request, as discord allows
+    PAGE_SIZE = 100
+
+    def __init__(self, shape: HistoryShape, *, channel_id: int = 1, guild_id: int = 1):
+        self.shape = shape
+        self.helper_ids = [self.HELPER_IDS_START + i for i in range(shape.helpers)]
+
+        started = datetime.datetime(2020, 1, 1)
+        self.id = discord.utils.time_snowflake(started)
+        self.guild = FakeObject(guild_id)
+        self._channel = FakeObject(channel_id)
+
+        self.messages: List[FakeMessage] = self._generate(started)
+        self.last_message_id = self.messages[-1].id if self.messages else None
+        # History requests made, to compare fetch strategies
+        self.pages_fetched = 0
+
+    def history(
+        self,
+        *,
+        limit: Optional[int] = None,
+        oldest_first: bool = True,
+        after: Optional[discord.abc.Snowflake] = None,
+        before: Optional[discord.abc.Snowflake] = None,
+    ) -> AsyncIterator[FakeMessage]:
+        return self._history(limit, oldest_first, after, before)
+
+    async def _history(self, limit, oldest_first, after, before):
+        """
+        Pages like discord.py 1.7: 100 messages per request, walking away
+        from ``after`` when oldest first and from ``before`` otherwise,
+        with the other bound only filtering each page
+        """
+        ids = [message.id for message in self.messages]
+        yielded = 0
+        if oldest_first:
+            position = bisect.bisect_right(ids, after.id) if after else 0
+        else:
+            position = bisect.bisect_left(ids, before.id) if before else len(ids)
+
+        while limit is None or yielded < limit:
+            if oldest_first:
+                page = self.messages[position : position + self.PAGE_SIZE]
+                position += len(page)
+            else:
+                page = self.messages[max(position - self.PAGE_SIZE, 0) : position]
+                page.reverse()
+                position -= len(page)
+
+            self.pages_fetched += 1
+            for message in page:
+                if after is not None and message.id <= after.id:
+                    continue
+                if before is not None and message.id >= before.id:
+                    continue
+                if limit is not None and yielded >= limit:
+                    return
+
+                yielded += 1
+                yield message
+
+            if len(page) < self.PAGE_SIZE:
+                return
+
+    def _generate(self, now: datetime.datetime) -> List[FakeMessage]:
+        shape = self.shape
+        rng = random.Random(shape.seed)
+        text = "x" * shape.content_length
+        messages = []
+        helpee = self.HELPEE_IDS_START
+        while len(messages) < shape.messages:
+            helpee += 1
+            now += datetime.timedelta(
+                seconds=rng.expovariate(1 / shape.mean_conversation_gap)
+            )
+            length = 1
+            while rng.random() > 1 / shape.mean_conversation_length:
+                length += 1
+
+            for index in range(min(length, shape.messages - len(messages))):
+                now += datetime.timedelta(
+                    seconds=rng.expovariate(1 / shape.mean_message_gap)
+                )
+                if index and rng.random() < shape.helper_ratio:
+                    author = FakeUser(rng.choice(self.helper_ids))
+                else:
+                    author = FakeUser(helpee, bot=rng.random() < shape.bot_ratio)
+
+                # Unique and increasing, even within a millisecond
+                message_id = discord.utils.time_snowflake(now)
+                if messages and message_id <= messages[-1].id:
+                    message_id = messages[-1].id + 1
+
+                messages.append(
+                    FakeMessage(
+                        id=message_id,
+                        author=author,
+                        content=text,
+                        channel=self._channel,
+                        guild=self.guild,
+                        created_at=now,
+                    )
+                )
+
+        return messages
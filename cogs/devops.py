@@ -1,14 +1,22 @@
+import asyncio
 import cProfile
 import pstats
 import timeit
+from typing import Dict, List, Union
 
 import discord
 from discord.ext import commands
 
+from conversations import IngestStats
 from utils.util import Pag
 
 
 class DevOps(commands.Cog):
+    # How many channels build_past_stats_many backfills at once,
+    # and how often, in seconds, its status message is updated
+    BACKFILL_CONCURRENCY = 3
+    PROGRESS_INTERVAL = 5
+
     def __init__(self, bot):
         self.bot = bot
 
@@ -26,22 +34,121 @@ class DevOps(commands.Cog):
         start_time = timeit.default_timer()
         async with ctx.typing():
             with cProfile.Profile() as pr:
-                convos = await self.bot.manager.build_past_conversations(channel)
+                ingest = await self.bot.manager.build_past_conversations(channel)
 
             stats = pstats.Stats(pr)
             stats.sort_stats(pstats.SortKey.TIME)
             stats.dump_stats(filename="profile.prof")
 
-        total_messages = 0
-        for convo in convos:
-            total_messages += len(convo.messages)
+        elapsed = timeit.default_timer() - start_time
+
+        await ctx.send(
+            f"Total conversations: `{ingest.conversations_written}`\n"
+            f"Total messages:`{ingest.messages_written}`\n"
+            f"Elapsed seconds: {elapsed}\n"
+            f"Fetched: `{ingest.messages_fetched_per_second():.0f}` messages/s\n"
+            f"Written: `{ingest.conversations_written_per_second():.0f}` conversations/s"
+        )
+
+    @commands.command(aliases=["bpsm", "buildpaststatsmany"], hidden=True)
+    @commands.has_role(603803993562677258)
+    async def build_past_stats_many(
+        self,
+        ctx,
+        *targets: Union[discord.TextChannel, discord.CategoryChannel],
+    ):
+        """
+        Builds stats for several channels at once, every text channel
+        in any category given, or every tracked support channel
+        """
+        channels: Dict[int, discord.TextChannel] = {}
+        for target in targets:
+            if isinstance(target, discord.CategoryChannel):
+                channels.update({c.id: c for c in target.text_channels})
+            else:
+                channels[target.id] = target
+
+        if not targets:
+            for channel_id in self.bot.support_channel_ids:
+                channel = self.bot.get_channel(channel_id)
+                if channel is not None:
+                    channels[channel.id] = channel
+
+        if not channels:
+            return await ctx.send("There are no channels to build stats for")
+
+        channels: List[discord.TextChannel] = list(channels.values())
+        progress: Dict[int, IngestStats] = {}
+        status = await ctx.send(self._format_backfill(channels, progress, {}))
+
+        start_time = timeit.default_timer()
+        build = asyncio.create_task(
+            self.bot.manager.build_many_past_conversations(
+                channels, concurrency=self.BACKFILL_CONCURRENCY, stats=progress
+            )
+        )
+        while not build.done():
+            await asyncio.wait({build}, timeout=self.PROGRESS_INTERVAL)
+            if not build.done():
+                await status.edit(
+                    content=self._format_backfill(channels, progress, {})
+                )
 
+        results = build.result()
         elapsed = timeit.default_timer() - start_time
 
+        await status.edit(
+            content=self._format_backfill(channels, progress, results)
+            + f"\nFinished in `{elapsed:.0f}` seconds"
+        )
+
+    @commands.command(aliases=["compactcontent"], hidden=True)
+    @commands.is_owner()
+    async def compact_content(self, ctx):
+        """Rewrites stored message content to match the datastore's content policy"""
+        datastore = self.bot.manager.datastore
+        start_time = timeit.default_timer()
+        async with ctx.typing():
+            try:
+                await datastore.compact_content()
+            except NotImplementedError:
+                return await ctx.send("This datastore can't compact stored content")
+
+        elapsed = timeit.default_timer() - start_time
         await ctx.send(
-            f"Total conversations: `{len(convos)}`\nTotal messages:`{total_messages}`\nElapsed seconds: {elapsed}"
+            f"Compacted content to `{datastore.content_policy.value}` "
+            f"in `{elapsed:.0f}` seconds"
         )
 
+    @staticmethod
+    def _format_backfill(
+        channels: List[discord.TextChannel],
+        progress: Dict[int, IngestStats],
+        results: Dict[int, Union[IngestStats, Exception]],
+    ) -> str:
+        """Renders a line per channel for the backfill status message"""
+        lines = []
+        for channel in channels:
+            result = results.get(channel.id)
+            stats = progress.get(channel.id)
+            if isinstance(result, Exception):
+                line = f"failed: `{result.__class__.__name__}: {result}`"
+            elif result is not None:
+                line = (
+                    f"done, `{result.conversations_written}` conversations "
+                    f"and `{result.messages_written}` messages, "
+                    f"`{result.messages_fetched_per_second():.0f}` messages/s"
+                )
+            elif stats is not None:
+                line = f"running, `{stats.messages_fetched}` messages fetched"
+            else:
+                line = "queued"
+
+            lines.append(f"{channel.mention}: {line}")
+
+        # Discord caps messages at 2000 characters
+        return "\n".join(lines)[:1900]
+
     @commands.command(name="commandstats", aliases=["cs"])
     @commands.cooldown(1, 5, commands.BucketType.guild)
     async def command_stats(self, ctx):
@@ -3,6 +3,8 @@ import traceback
 import sys
 from discord.ext import commands
 
+from conversations.render import RenderTimeout
+
 
 class CommandErrorHandler(commands.Cog):
     def __init__(self, bot):
@@ -73,6 +75,9 @@ class CommandErrorHandler(commands.Cog):
                 f"used {error.number} command(s) at a time under {str(error.per)}"
             )
 
+        elif isinstance(error, RenderTimeout):
+            await ctx.send("That plot took too long to draw, try again later.")
+
         print("Ignoring exception in command {}:".format(ctx.command), file=sys.stderr)
         traceback.print_exception(
             type(error), error, error.__traceback__, file=sys.stderr
@@ -18,7 +18,7 @@ class Plot(commands.Cog):
         await ctx.invoke(self.bot.get_command("help"), entity="plot")
 
     @plot.command(aliases=["hcl"])
-    @commands.cooldown(1, 30)
+    @commands.cooldown(1, 30, commands.BucketType.user)
     async def helper_convos_vs_convo_length(self, ctx):
         """Builds a plot of helper conversation times vs lengths"""
         async with ctx.typing():
@@ -26,9 +26,7 @@ class Plot(commands.Cog):
                 ctx.guild
             )
             enum = Plots.HELPER_CONVOS_VS_CONVO_LENGTH
-            self.bot.manager.save_plot(plot, enum)
-
-            file: discord.File = self.bot.manager.get_plot_image(enum)
+            file: discord.File = self.bot.manager.get_plot_file(plot, enum)
             embed = discord.Embed(
                 title="Support Team\nConversations vs Average Conversation Length",
                 timestamp=ctx.message.created_at,
@@ -43,7 +41,7 @@ class Plot(commands.Cog):
         )
 
     @plot.command(aliases=["htl"])
-    @commands.cooldown(1, 30)
+    @commands.cooldown(1, 30, commands.BucketType.user)
     async def helper_time_vs_length_convos(self, ctx):
         """Builds a plot of helper convo times vs lengths"""
         async with ctx.typing():
@@ -51,9 +49,7 @@ class Plot(commands.Cog):
                 ctx.guild
             )
             enum = Plots.HELPER_CONVO_TIME_VS_CONVO_LENGTH
-            self.bot.manager.save_plot(plot, enum)
-
-            file: discord.File = self.bot.manager.get_plot_image(enum)
+            file: discord.File = self.bot.manager.get_plot_file(plot, enum)
             embed = discord.Embed(
                 title="Support Team\nAverage Conversation Time vs Average Conversation Length",
                 timestamp=ctx.message.created_at,
@@ -68,18 +64,18 @@ class Plot(commands.Cog):
         )
 
     @plot.command(aliases=["srt"])
-    @commands.cooldown(1, 30)
-    async def average_support_response_time(self, ctx):
+    @commands.cooldown(1, 30, commands.BucketType.user)
+    async def average_support_response_time(self, ctx, threshold: float = 100):
         """Builds a histogram plotting average support response time"""
         async with ctx.typing():
-            plot = await self.bot.manager.build_average_support_response_time()
+            plot = await self.bot.manager.build_average_support_response_time(
+                threshold
+            )
             enum = Plots.AVERAGE_SUPPORT_RESPONSE_TIME
-            self.bot.manager.save_plot(plot, enum)
-
-            file: discord.File = self.bot.manager.get_plot_image(enum)
+            file: discord.File = self.bot.manager.get_plot_file(plot, enum)
             embed = discord.Embed(
                 title="Average Support Response Time",
-                description="Values over 100 minutes are considered to be outliers and are discarded.",
+                description=f"Values over {threshold:g} minutes are considered to be outliers and are discarded.",
                 timestamp=ctx.message.created_at,
             )
             embed.set_footer(text="Valid as at")
@@ -21,6 +21,17 @@ class Stats(commands.Cog):
         embed = await self.bot.manager.get_message_stats()
         await ctx.send(embed=embed)
 
+    @commands.command(aliases=["rt"])
+    @commands.cooldown(1, 30)
+    async def response_times(self, ctx, threshold: float = 100):
+        """Shows response times overall, per channel and per helper"""
+        async with ctx.typing():
+            embed = await self.bot.manager.get_response_time_stats(
+                ctx.guild, threshold
+            )
+
+        await ctx.send(embed=embed)
+
 
 def setup(bot):
     bot.add_cog(Stats(bot))
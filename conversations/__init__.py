@@ -1,3 +1,17 @@
-from .dataclasses import Conversation, Message, Helper, Plots
+from .dataclasses import (
+    Conversation,
+    Message,
+    Helper,
+    Plots,
+    Aggregate,
+    MessageSummary,
+    Checkpoint,
+    IngestStats,
+    HelperDelta,
+    ContentPolicy,
+    CompressedText,
+    ConversationMetrics,
+)
+from .batch import ConversationBatch
 from .manager import Manager
 from .datastore import Mongo
@@ -1,6 +1,16 @@
-from typing import Protocol, List, Union
+import contextlib
+import datetime
+from typing import Protocol, List, Union, AsyncIterator, Optional
 
-from conversations import Conversation, Helper
+from conversations import (
+    Conversation,
+    Helper,
+    MessageSummary,
+    Checkpoint,
+    HelperDelta,
+    ConversationMetrics,
+)
+from conversations.batch import ConversationBatch
 
 
 class DataStore(Protocol):
@@ -19,6 +29,19 @@ class DataStore(Protocol):
         """
         raise NotImplementedError
 
+    async def save_conversations(self, conversations: List[Conversation]) -> None:
+        """
+        Save many :class: Conversation objects at once,
+        as if each was passed to save_conversation but
+        without paying a round trip per conversation
+
+        Parameters
+        ----------
+        conversations : List[Conversation]
+            The conversations to save
+        """
+        raise NotImplementedError
+
     async def fetch_conversation(self, identifier: int) -> Conversation:
         """
         Given an identifier for a :class: Conversation
@@ -49,6 +72,18 @@ class DataStore(Protocol):
         """
         raise NotImplementedError
 
+    async def fetch_data_version(self) -> int:
+        """
+        Fetch a number which changes whenever conversations
+        or helpers do, for telling when derived data is stale
+
+        Returns
+        -------
+        int
+            The current data version
+        """
+        raise NotImplementedError
+
     async def fetch_helper(self, identifier: int) -> Helper:
         """
         Given an identifier, return a valid
@@ -102,6 +137,92 @@ class DataStore(Protocol):
         """
         raise NotImplementedError
 
+    def iter_conversations(
+        self,
+        batch_size: int = 500,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> AsyncIterator[Conversation]:
+        """
+        Lazily yields conversations ordered by identifier,
+        fetching ``batch_size`` of them from the backend
+        at a time rather than all of them up front
+
+        Parameters
+        ----------
+        batch_size : int
+            How many conversations to fetch per round trip
+        since : Optional[datetime.datetime]
+            Only yield conversations starting at or after this
+        until : Optional[datetime.datetime]
+            Only yield conversations starting before this
+
+        Yields
+        ------
+        Conversation
+            The next conversation
+        """
+        raise NotImplementedError
+
+    async def fetch_conversation_batch(
+        self,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> ConversationBatch:
+        """
+        Fetch conversations as one :class: ConversationBatch,
+        without building a Conversation or Message per row
+
+        Parameters
+        ----------
+        since : Optional[datetime.datetime]
+            Only include conversations which started at or after this
+        until : Optional[datetime.datetime]
+            Only include conversations which started before this
+
+        Returns
+        -------
+        ConversationBatch
+            The matching conversations, ordered by identifier
+        """
+        raise NotImplementedError
+
+    async def fetch_conversation_metrics(
+        self,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> List[ConversationMetrics]:
+        """
+        Fetch the metrics worked out for each conversation as it
+        was saved, without reading any of their messages
+
+        Parameters
+        ----------
+        since : Optional[datetime.datetime]
+            Only include conversations which started at or after this
+        until : Optional[datetime.datetime]
+            Only include conversations which started before this
+
+        Returns
+        -------
+        List[ConversationMetrics]
+            The matching conversations' metrics, ordered by identifier
+        """
+        raise NotImplementedError
+
+    async def fetch_message_summary(self) -> MessageSummary:
+        """
+        Counts messages, unique authors and helper
+        messages across every stored conversation,
+        ideally without loading the messages themselves
+
+        Returns
+        -------
+        MessageSummary
+            The totals
+        """
+        raise NotImplementedError
+
     async def fetch_all_helpers(self) -> List[Helper]:
         """
         Returns a list of all helpers to make dataclasses for
@@ -113,8 +234,91 @@ class DataStore(Protocol):
         """
         raise NotImplementedError
 
+    async def fetch_checkpoint(self, channel_id: int) -> Optional[Checkpoint]:
+        """
+        Fetch how far the given channel's history
+        has been backfilled, if it has been at all
+
+        Parameters
+        ----------
+        channel_id : int
+            The channel to fetch the checkpoint for
+
+        Returns
+        -------
+        Optional[Checkpoint]
+            The stored checkpoint, or None
+        """
+        raise NotImplementedError
+
+    async def store_checkpoint(self, checkpoint: Checkpoint) -> None:
+        """
+        Store a checkpoint, replacing any
+        existing one for the same channel
+
+        Parameters
+        ----------
+        checkpoint : Checkpoint
+            The checkpoint to store
+        """
+        raise NotImplementedError
+
+    async def apply_helper_deltas(
+        self, deltas: List[HelperDelta], checkpoint: Optional[Checkpoint] = None
+    ) -> None:
+        """
+        Add a batch of increments to helpers' stored
+        totals, along with the checkpoint they lead up to
+
+        Both are written together, so after a crash
+        resuming from the checkpoint neither loses
+        nor repeats any of the increments
+
+        Parameters
+        ----------
+        deltas : List[HelperDelta]
+            The increments to apply
+        checkpoint : Optional[Checkpoint]
+            The checkpoint to store with them, if any
+        """
+        raise NotImplementedError
+
+    async def compact_content(self) -> None:
+        """
+        Rewrite the content of every stored message to
+        match the datastore's :class: ContentPolicy, so
+        switching policy also shrinks existing data
+        """
+        raise NotImplementedError
+
     async def create_indexes(self) -> None:
         """
         Creates indexes in the database to support faster queries
         """
         raise NotImplementedError
+
+    async def open(self) -> None:
+        """
+        Perform any one off setup such as opening
+        connections or creating the schema.
+        Called once before the datastore is used
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """
+        Release any connections or sessions
+        held open by this datastore
+        """
+        raise NotImplementedError
+
+    @contextlib.asynccontextmanager
+    async def bulk_load(self) -> AsyncIterator[None]:
+        """
+        Wraps large ingests such as backfills, letting
+        a datastore trade durability for write speed
+        until the block exits.
+
+        Datastores with nothing to tune can leave this as is.
+        """
+        yield
@@ -0,0 +1,122 @@
+"""
+Response time statistics over a ConversationBatch, with NumPy.
+
+A response time is how long after its conversation started a helper
+sent a message, in minutes. Anything over ``threshold`` minutes is
+treated as an outlier and dropped, pass None to keep everything.
+"""
+from typing import Dict, Optional
+
+import attr
+import numpy as np
+
+from conversations.batch import ConversationBatch
+
+DEFAULT_THRESHOLD = 100.0  # Minutes
+
+MICROSECONDS_PER_SECOND = 1e6
+
+
+@attr.s(slots=True, frozen=True)
+class ResponseTimeSummary:
+    """The shape of a set of response times, all in minutes"""
+
+    count: int = attr.ib()
+    mean: float = attr.ib()
+    median: float = attr.ib()
+    p90: float = attr.ib()
+
+    @classmethod
+    def from_times(cls, times: np.ndarray) -> "ResponseTimeSummary":
+        if not len(times):
+            return cls(0, 0.0, 0.0, 0.0)
+
+        median, p90 = np.percentile(times, [50, 90])
+        return cls(len(times), float(times.mean()), float(median), float(p90))
+
+
+def response_times(
+    batch: ConversationBatch, *, threshold: Optional[float] = DEFAULT_THRESHOLD
+) -> np.ndarray:
+    """
+    Every helper message's response time, in message order
+
+    Returns
+    -------
+    np.ndarray
+        float64 minutes, equal bit for bit to
+        ``(timestamp - start_time).total_seconds() / 60``
+    """
+    return _filter(_message_offsets(batch)[batch.is_helper], threshold)
+
+
+def first_response_times(
+    batch: ConversationBatch, *, threshold: Optional[float] = DEFAULT_THRESHOLD
+) -> np.ndarray:
+    """
+    How long each conversation waited for its first helper message.
+    Conversations no helper spoke in are left out
+    """
+    helper_conversations = _message_conversations(batch)[batch.is_helper]
+    # Messages are in order within a conversation,
+    # so the first occurrence is the first response
+    _, first = np.unique(helper_conversations, return_index=True)
+    return _filter(_message_offsets(batch)[batch.is_helper][first], threshold)
+
+
+def response_times_by_helper(
+    batch: ConversationBatch, *, threshold: Optional[float] = DEFAULT_THRESHOLD
+) -> Dict[int, np.ndarray]:
+    """Response times grouped by the helper who responded"""
+    return _group(
+        batch.author_ids[batch.is_helper],
+        _message_offsets(batch)[batch.is_helper],
+        threshold,
+    )
+
+
+def response_times_by_channel(
+    batch: ConversationBatch, *, threshold: Optional[float] = DEFAULT_THRESHOLD
+) -> Dict[int, np.ndarray]:
+    """Response times grouped by the channel they were sent in"""
+    channels = np.repeat(batch.channel_ids, batch.messages_per_conversation())
+    return _group(
+        channels[batch.is_helper],
+        _message_offsets(batch)[batch.is_helper],
+        threshold,
+    )
+
+
+def _message_offsets(batch: ConversationBatch) -> np.ndarray:
+    # Offsets are far below 2**53 microseconds, so they convert to float64
+    # exactly and this divides the same numbers timedelta.total_seconds() does
+    offsets = batch.timestamps - batch.message_start_times()
+    return offsets / MICROSECONDS_PER_SECOND / 60
+
+
+def _message_conversations(batch: ConversationBatch) -> np.ndarray:
+    """The index of each message's conversation within the batch"""
+    return np.repeat(np.arange(len(batch)), batch.messages_per_conversation())
+
+
+def _filter(times: np.ndarray, threshold: Optional[float]) -> np.ndarray:
+    if threshold is None:
+        return times
+
+    return times[times <= threshold]
+
+
+def _group(
+    keys: np.ndarray, times: np.ndarray, threshold: Optional[float]
+) -> Dict[int, np.ndarray]:
+    if threshold is not None:
+        keep = times <= threshold
+        keys, times = keys[keep], times[keep]
+
+    # A stable sort keeps each group in message order
+    order = np.argsort(keys, kind="stable")
+    keys, times = keys[order], times[order]
+    unique, starts = np.unique(keys, return_index=True)
+    return {
+        int(key): group for key, group in zip(unique, np.split(times, starts[1:]))
+    }
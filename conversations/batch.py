@@ -0,0 +1,149 @@
+import datetime
+from typing import Iterable, List
+
+import attr
+import numpy as np
+
+from conversations import Conversation
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def to_micros(timestamp: datetime.datetime) -> int:
+    """
+    Whole microseconds since the unix epoch. Naive datetimes
+    are taken to be UTC already, as discord.py gives us
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    return (timestamp - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+@attr.s(slots=True, eq=False)
+class ConversationBatch:
+    """
+    Conversations laid out as parallel NumPy arrays rather
+    than objects, for statistics over a lot of them at once.
+
+    Timestamps are int64 microseconds since the unix epoch.
+    Messages are grouped by conversation, in the same order as
+    the conversation arrays, and the messages of conversation
+    ``i`` are ``offsets[i]:offsets[i + 1]`` in every message array.
+    Message content isn't kept, no statistic uses it.
+    """
+
+    # One entry per conversation
+    identifiers: np.ndarray = attr.ib()
+    start_times: np.ndarray = attr.ib()
+    end_times: np.ndarray = attr.ib()
+    channel_ids: np.ndarray = attr.ib()
+    offsets: np.ndarray = attr.ib()
+
+    # One entry per message
+    conversation_ids: np.ndarray = attr.ib()
+    author_ids: np.ndarray = attr.ib()
+    timestamps: np.ndarray = attr.ib()
+    is_helper: np.ndarray = attr.ib()
+
+    def __len__(self) -> int:
+        return len(self.identifiers)
+
+    @property
+    def message_count(self) -> int:
+        return len(self.timestamps)
+
+    @classmethod
+    def empty(cls) -> "ConversationBatch":
+        return cls.from_columns([], [], [], [], [], [], [], [])
+
+    @classmethod
+    def from_columns(
+        cls,
+        identifiers: Iterable[int],
+        start_times: Iterable[int],
+        end_times: Iterable[int],
+        channel_ids: Iterable[int],
+        conversation_ids: Iterable[int],
+        author_ids: Iterable[int],
+        timestamps: Iterable[int],
+        is_helper: Iterable[bool],
+    ) -> "ConversationBatch":
+        """
+        Builds a batch from plain columns, as a datastore query returns them.
+        Conversations must be in ascending identifier order, with their
+        messages grouped by conversation in that same order
+        """
+        identifiers = np.asarray(identifiers, dtype=np.int64)
+        conversation_ids = np.asarray(conversation_ids, dtype=np.int64)
+
+        # Each conversation's messages start where its id first appears
+        positions = np.searchsorted(conversation_ids, identifiers, side="left")
+        offsets = np.append(positions, len(conversation_ids)).astype(np.int64)
+
+        return cls(
+            identifiers=identifiers,
+            start_times=np.asarray(start_times, dtype=np.int64),
+            end_times=np.asarray(end_times, dtype=np.int64),
+            channel_ids=np.asarray(channel_ids, dtype=np.int64),
+            offsets=offsets,
+            conversation_ids=conversation_ids,
+            author_ids=np.asarray(author_ids, dtype=np.int64),
+            timestamps=np.asarray(timestamps, dtype=np.int64),
+            is_helper=np.asarray(is_helper, dtype=bool),
+        )
+
+    @classmethod
+    def from_conversations(
+        cls, conversations: Iterable[Conversation]
+    ) -> "ConversationBatch":
+        """Builds a batch from Conversation objects, sorted by identifier"""
+        conversations = sorted(conversations, key=lambda c: c.identifier)
+        messages = [
+            (conversation.identifier, message)
+            for conversation in conversations
+            for message in conversation.messages
+        ]
+        return cls.from_columns(
+            [c.identifier for c in conversations],
+            [to_micros(c.start_time) for c in conversations],
+            [to_micros(c.end_time) for c in conversations],
+            [c.channel_id for c in conversations],
+            [identifier for identifier, _ in messages],
+            [message.author_id for _, message in messages],
+            [to_micros(message.timestamp) for _, message in messages],
+            [message.is_helper for _, message in messages],
+        )
+
+    @classmethod
+    def concatenate(cls, batches: List["ConversationBatch"]) -> "ConversationBatch":
+        """Joins batches which hold increasing, non overlapping identifiers"""
+        if not batches:
+            return cls.empty()
+
+        return cls.from_columns(
+            *(
+                np.concatenate([getattr(batch, column) for batch in batches])
+                for column in (
+                    "identifiers",
+                    "start_times",
+                    "end_times",
+                    "channel_ids",
+                    "conversation_ids",
+                    "author_ids",
+                    "timestamps",
+                    "is_helper",
+                )
+            )
+        )
+
+    def messages_per_conversation(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def lengths(self) -> np.ndarray:
+        """How long each conversation lasted, in microseconds"""
+        return self.end_times - self.start_times
+
+    def message_start_times(self) -> np.ndarray:
+        """The start time of each message's conversation, per message"""
+        return np.repeat(self.start_times, self.messages_per_conversation())
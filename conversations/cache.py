@@ -0,0 +1,150 @@
+import asyncio
+import collections
+import contextlib
+import hashlib
+import os
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from conversations import Plots
+
+Key = Tuple[Plots, Tuple[Hashable, ...], int]
+
+
+class RenderCache:
+    """
+    Rendered plots, keyed by the plot, its parameters and the
+    datastore's data version at the time it was drawn. Once new
+    data is saved the version moves on, so stale images are
+    never served and just age out of the cache.
+
+    Images are held in memory, least recently used going first,
+    and optionally in a directory so they survive restarts.
+    Requests for an image already being rendered wait for it
+    rather than rendering it again.
+    """
+
+    def __init__(self, *, max_items: int = 32, directory: Optional[str] = None):
+        self.max_items = max_items
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        self._images: "collections.OrderedDict[Key, bytes]" = (
+            collections.OrderedDict()
+        )
+        self._pending: Dict[Key, asyncio.Future] = {}
+
+    async def fetch(
+        self,
+        plot: Plots,
+        params: Tuple[Hashable, ...],
+        version: Optional[int],
+        render: Callable[[], Awaitable[bytes]],
+    ) -> bytes:
+        """
+        Returns the cached image, rendering it if there isn't one
+
+        Parameters
+        ----------
+        plot : Plots
+            Which plot this is
+        params : Tuple[Hashable, ...]
+            Whatever else the image depends on, such as a threshold
+        version : Optional[int]
+            The datastore's data version, None skips the cache
+        render : Callable[[], Awaitable[bytes]]
+            Renders the image on a miss
+
+        Returns
+        -------
+        bytes
+            The image as a PNG
+        """
+        if version is None:
+            return await render()
+
+        key = (plot, params, version)
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+            return image
+
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            image = await self._read(key)
+            if image is None:
+                image = await render()
+                await self._write(key, image)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark it retrieved, nobody may be waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+        future.set_result(image)
+        self._remember(key, image)
+        return image
+
+    def clear(self) -> None:
+        """Forgets everything held in memory"""
+        self._images.clear()
+
+    def _remember(self, key: Key, image: bytes) -> None:
+        self._images[key] = image
+        self._images.move_to_end(key)
+        while len(self._images) > self.max_items:
+            self._images.popitem(last=False)
+
+    def _prefix(self, key: Key) -> str:
+        plot, params, _ = key
+        digest = hashlib.sha1(repr(params).encode()).hexdigest()[:16]
+        return f"{plot.name.lower()}-{digest}-"
+
+    async def _read(self, key: Key) -> Optional[bytes]:
+        if self.directory is None:
+            return None
+
+        path = os.path.join(self.directory, f"{self._prefix(key)}{key[2]}.png")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, _read_file, path)
+
+    async def _write(self, key: Key, image: bytes) -> None:
+        if self.directory is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, _write_file, self.directory, self._prefix(key), key[2], image
+        )
+
+
+def _read_file(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write_file(directory: str, prefix: str, version: int, image: bytes) -> None:
+    """Writes an image, removing any older versions of it"""
+    name = f"{prefix}{version}.png"
+    path = os.path.join(directory, name)
+    with open(f"{path}.tmp", "wb") as file:
+        file.write(image)
+
+    os.replace(f"{path}.tmp", path)
+
+    for other in os.listdir(directory):
+        if other.startswith(prefix) and other != name and other.endswith(".png"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(directory, other))
@@ -0,0 +1,46 @@
+import zlib
+from typing import Union
+
+from conversations import ContentPolicy, CompressedText
+
+
+def encode_content(
+    content: Union[str, CompressedText], policy: ContentPolicy
+) -> Union[str, bytes]:
+    """
+    Turns message content into what a datastore should store under
+    ``policy``. Compressed content is only kept compressed when that
+    actually saves space, which it rarely does for short messages
+    """
+    if policy is ContentPolicy.NONE:
+        return ""
+
+    if policy is ContentPolicy.FULL:
+        return str(content)
+
+    if isinstance(content, CompressedText):
+        return content.data
+
+    return compress_content(content)
+
+
+def compress_content(content: Union[str, bytes]) -> Union[str, bytes]:
+    """Compresses stored text, leaving anything already compressed alone"""
+    if isinstance(content, bytes) or not content:
+        return content
+
+    compressed = zlib.compress(content.encode("utf-8"))
+    return compressed if len(compressed) < len(content.encode("utf-8")) else content
+
+
+def decompress_content(content: Union[str, bytes]) -> str:
+    """Reverses compress_content"""
+    return str(decode_content(content))
+
+
+def decode_content(content: Union[str, bytes]) -> Union[str, CompressedText]:
+    """Rebuilds message content from whatever encode_content stored"""
+    if isinstance(content, bytes):
+        return CompressedText(content)
+
+    return content
@@ -1,15 +1,65 @@
 import datetime
+import zlib
 from enum import Enum
-from typing import List
+from typing import Dict, List, Optional, Tuple, Union
 
 import attr
 
 
+class ContentPolicy(Enum):
+    """How much of each message's content a datastore keeps"""
+
+    FULL = "full"
+    COMPRESSED = "compressed"
+    # Metadata only, content is stored as an empty string
+    NONE = "none"
+
+
+class CompressedText:
+    """
+    Message content as stored under ContentPolicy.COMPRESSED,
+    only decompressed the first time it is turned into a str.
+
+    Deliberately not an attrs class, so attr.asdict
+    leaves it alone rather than recursing into it
+    """
+
+    __slots__ = ("data", "_text")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._text: Optional[str] = None
+
+    @classmethod
+    def compress(cls, text: str) -> "CompressedText":
+        compressed = cls(zlib.compress(text.encode("utf-8")))
+        compressed._text = text
+        return compressed
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = zlib.decompress(self.data).decode("utf-8")
+
+        return self._text
+
+    def __repr__(self) -> str:
+        return f"CompressedText({len(self.data)} bytes)"
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (str, CompressedText)):
+            return str(self) == str(other)
+
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+
 @attr.s(slots=True, frozen=True)
 class Message:
     author_id: int = attr.ib()
     channel_id: int = attr.ib()
-    content: str = attr.ib()
+    content: Union[str, CompressedText] = attr.ib()
     guild_id: int = attr.ib()
     message_id: int = attr.ib()
     timestamp: datetime.datetime = attr.ib()
@@ -38,8 +88,104 @@ class Conversation:
     topic: str = attr.ib(default=None, kw_only=True)
 
 
+@attr.s(slots=True, frozen=True)
+class ConversationMetrics:
+    """
+    Figures derived from a conversation's messages, worked out
+    once as it is saved so statistics don't re-read messages
+    """
+
+    identifier: int = attr.ib()
+    channel_id: int = attr.ib()
+    start_time: datetime.datetime = attr.ib()
+    end_time: datetime.datetime = attr.ib()
+
+    helper_messages: int = attr.ib()
+    helpee_messages: int = attr.ib()
+    # Sorted, each helper who sent at least one message
+    helper_ids: Tuple[int, ...] = attr.ib(converter=lambda ids: tuple(sorted(ids)))
+    # How long until the first helper message, if there was one
+    first_response_time: Optional[datetime.timedelta] = attr.ib()
+
+    @property
+    def duration(self) -> datetime.timedelta:
+        return self.end_time - self.start_time
+
+    @property
+    def total_messages(self) -> int:
+        return self.helper_messages + self.helpee_messages
+
+    @classmethod
+    def from_conversation(cls, conversation: Conversation) -> "ConversationMetrics":
+        helper_messages = [m for m in conversation.messages if m.is_helper]
+        first_response_time = None
+        if helper_messages:
+            first_response = min(m.timestamp for m in helper_messages)
+            first_response_time = first_response - conversation.start_time
+
+        return cls(
+            identifier=conversation.identifier,
+            channel_id=conversation.channel_id,
+            start_time=conversation.start_time,
+            end_time=conversation.end_time,
+            helper_messages=len(helper_messages),
+            helpee_messages=len(conversation.messages) - len(helper_messages),
+            helper_ids={m.author_id for m in helper_messages},
+            first_response_time=first_response_time,
+        )
+
+
+@attr.s(slots=True)
+class Aggregate:
+    """
+    A running summary of a series of values, so averages,
+    spread and rough distributions can be answered
+    without keeping every value around
+    """
+
+    # Values at or past the last bucket all land in it
+    BUCKET_COUNT = 100
+
+    count: int = attr.ib(default=0)
+    total: float = attr.ib(default=0)
+    total_squares: float = attr.ib(default=0)
+    minimum: Optional[float] = attr.ib(default=None)
+    maximum: Optional[float] = attr.ib(default=None)
+    # Maps a bucket index, see bucket_for, to how many values fell in it
+    buckets: Dict[int, int] = attr.ib(default=attr.Factory(dict))
+
+    bucket_width: float = attr.ib(default=1, kw_only=True)
+
+    def add(self, value: float) -> None:
+        """Adds a value to the summary"""
+        self.count += 1
+        self.total += value
+        self.total_squares += value * value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+        bucket = self.bucket_for(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def bucket_for(self, value: float) -> int:
+        """Returns the histogram bucket a value belongs to"""
+        return min(int(value // self.bucket_width), self.BUCKET_COUNT - 1)
+
+    def mean(self) -> float:
+        return self.total / self.count
+
+    def variance(self) -> float:
+        """The population variance of every value added"""
+        mean = self.mean()
+        return max(self.total_squares / self.count - mean * mean, 0.0)
+
+
 @attr.s(slots=True)
 class Helper:
+    # Bucket widths used by the aggregates below
+    MESSAGES_BUCKET_WIDTH = 1
+    LENGTH_BUCKET_WIDTH = 300  # Seconds
+
     identifier: int = attr.ib(eq=True)
     total_messages: int = attr.ib(default=0, eq=False)
     total_conversations: int = attr.ib(default=0, eq=False)
@@ -48,29 +194,130 @@ class Helper:
         default=attr.Factory(list), eq=False
     )
 
+    # Pre-computed summaries of the two lists above, where
+    # the datastore keeps them. Conversation lengths are in seconds
+    messages_aggregate: Optional[Aggregate] = attr.ib(
+        default=None, eq=False, kw_only=True
+    )
+    length_aggregate: Optional[Aggregate] = attr.ib(
+        default=None, eq=False, kw_only=True
+    )
+
     def get_average_messages_per_convo(self) -> int:
         """
         Returns the amount of messages this
         helper sends per conversation on average
         """
-        return round(
-            sum(self.messages_per_conversation) / len(self.messages_per_conversation)
-        )
+        return round(self.mean_messages_per_convo())
 
     def get_average_time_per_convo(self) -> int:
         """
         Returns the average amount of minutes
         spent per support conversation
         """
+        return round(self.mean_time_per_convo().total_seconds() / 60)
+
+    def mean_messages_per_convo(self) -> float:
+        """
+        The unrounded average amount of messages sent
+        per conversation, 0 before their first one
+        """
+        if self.messages_aggregate is not None:
+            if not self.messages_aggregate.count:
+                return 0.0
+
+            return self.messages_aggregate.mean()
+
+        if not self.messages_per_conversation:
+            return 0.0
+
+        return sum(self.messages_per_conversation) / len(
+            self.messages_per_conversation
+        )
+
+    def mean_time_per_convo(self) -> datetime.timedelta:
+        """
+        The unrounded average length of this helper's
+        conversations, zero before their first one
+        """
+        if self.length_aggregate is not None:
+            if not self.length_aggregate.count:
+                return datetime.timedelta()
+
+            return datetime.timedelta(seconds=self.length_aggregate.mean())
+
+        if not self.conversation_length:
+            return datetime.timedelta()
+
         summed = 0
         for item in self.conversation_length:
             summed += item.total_seconds()
         length = len(self.conversation_length)
-        time_in_seconds = summed / length
-        return round(time_in_seconds / 60)
+        return datetime.timedelta(seconds=summed / length)
+
+
+@attr.s(slots=True, frozen=True)
+class MessageSummary:
+    total_messages: int = attr.ib()
+    total_authors: int = attr.ib()
+    total_helper_messages: int = attr.ib()
+
+    @property
+    def total_helpee_messages(self) -> int:
+        return self.total_messages - self.total_helper_messages
+
+
+@attr.s(slots=True)
+class Checkpoint:
+    """How far a channel's history has been processed, so a backfill can resume"""
+
+    channel_id: int = attr.ib()
+    last_message_id: int = attr.ib()
+
+    # The conversation still open as of last_message_id, if any,
+    # along with how many messages each helper has sent in it
+    conversation: Optional[Conversation] = attr.ib(default=None)
+    current_helpers: Dict[int, int] = attr.ib(default=attr.Factory(dict))
+
+
+@attr.s(slots=True)
+class HelperDelta:
+    """Increments to one helper's stored totals, see HelperDeltaBuffer"""
+
+    identifier: int = attr.ib()
+    total_messages: int = attr.ib(default=0)
+    total_conversations: int = attr.ib(default=0)
+    messages_per_conversation: List[int] = attr.ib(default=attr.Factory(list))
+    conversation_length: List[datetime.timedelta] = attr.ib(
+        default=attr.Factory(list)
+    )
+
+
+@attr.s(slots=True)
+class IngestStats:
+    """Throughput of each stage of a backfill"""
+
+    messages_fetched: int = attr.ib(default=0)
+    conversations_written: int = attr.ib(default=0)
+    messages_written: int = attr.ib(default=0)
+
+    # Wall clock seconds from the start of the
+    # backfill until each stage had finished
+    fetch_seconds: float = attr.ib(default=0)
+    write_seconds: float = attr.ib(default=0)
+
+    def messages_fetched_per_second(self) -> float:
+        return self.messages_fetched / self.fetch_seconds if self.fetch_seconds else 0.0
+
+    def conversations_written_per_second(self) -> float:
+        if not self.write_seconds:
+            return 0.0
+
+        return self.conversations_written / self.write_seconds
 
 
 class Plots(Enum):
     HELPER_CONVOS_VS_CONVO_LENGTH = "helper_convos_vs_convo_length_plot.png"
     HELPER_CONVO_TIME_VS_CONVO_LENGTH = "helper_convo_time_vs_convo_length_plot.png"
     AVERAGE_SUPPORT_RESPONSE_TIME = "average_support_response_time.png"
+    TIMED_SCATTER = "timed_scatter_plot.png"
@@ -1,16 +1,33 @@
+import asyncio
 import datetime
 import os
-from typing import List, Tuple
+from typing import List, Tuple, Optional, AsyncIterator
+from urllib.parse import urlencode
 
 import aiohttp
 from attr import asdict
 
-from conversations import Helper, Conversation, Message
+from conversations import (
+    Helper,
+    Conversation,
+    Message,
+    MessageSummary,
+    Checkpoint,
+    HelperDelta,
+    ContentPolicy,
+    ConversationMetrics,
+)
 from conversations.abc import DataStore
+from conversations.batch import ConversationBatch, to_micros
 
 
 class ApiStore(DataStore):
-    def __init__(self):
+    def __init__(self, *, content_policy: ContentPolicy = ContentPolicy.FULL):
+        if content_policy is ContentPolicy.COMPRESSED:
+            # The API only accepts JSON strings for message content
+            raise ValueError("ApiStore can't store compressed content")
+
+        self.content_policy = content_policy
         self.access_token = None
         self.refresh_token = None
         self.last_validated = None
@@ -20,6 +37,11 @@ class ApiStore(DataStore):
         self.base_url = "https://stats.koldfusion.xyz/api/"
         # self.base_url = "http://127.0.0.1:8000/api/"
 
+        # Whether conversation/create/batch/ exists, and how many
+        # single creates to run at once when it doesn't
+        self.supports_batch_create = True
+        self.max_concurrent_requests = 8
+
     async def _set_new_tokens(self) -> None:
         """Get and set a set of tokens using USERNAME / PASSWORD"""
         payload = {
@@ -105,24 +127,59 @@ class ApiStore(DataStore):
         """Given a string denoting a timedelta, create and return one"""
         return datetime.timedelta(seconds=float(incoming))
 
-    async def create_indexes(self) -> None:
-        """Do nothing since indexes are defined at a model level in django"""
+    async def open(self) -> None:
+        """Tokens are fetched on first request, so there is nothing to do"""
         pass
 
-    async def save_conversation(self, conversation: Conversation) -> None:
-        data = asdict(conversation, recurse=True)
+    async def close(self) -> None:
+        await self.session.close()
 
-        data["start_time"] = self._convert_from_datetime(data["start_time"])
-        data["end_time"] = self._convert_from_datetime(data["end_time"])
+    async def create_indexes(self) -> None:
+        """Do nothing since indexes are defined at a model level in django"""
+        pass
 
-        for m in data["messages"]:
-            m["timestamp"] = self._convert_from_datetime(m["timestamp"])
+    async def compact_content(self) -> None:
+        """Stored conversations can't be rewritten through the API"""
+        raise NotImplementedError
 
+    async def save_conversation(self, conversation: Conversation) -> None:
         status, _ = await self._make_post_request(
-            self.base_url + "conversation/create/", data
+            self.base_url + "conversation/create/",
+            self._dump_conversation(conversation),
         )
         assert status == 201
 
+    async def save_conversations(self, conversations: List[Conversation]) -> None:
+        """Uses the batch endpoint where the server has one,
+        otherwise posts each conversation with bounded concurrency
+        """
+        if not conversations:
+            return
+
+        if self.supports_batch_create:
+            await self._validate_token()
+
+            headers = {"Authorization": f"Bearer {self.access_token}"}
+            async with self.session.post(
+                self.base_url + "conversation/create/batch/",
+                json=[self._dump_conversation(c) for c in conversations],
+                headers=headers,
+            ) as resp:
+                if resp.status == 201:
+                    return
+
+                # Older servers don't have the endpoint at all
+                assert resp.status in (404, 405)
+                self.supports_batch_create = False
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+
+        async def save(conversation: Conversation) -> None:
+            async with semaphore:
+                await self.save_conversation(conversation)
+
+        await asyncio.gather(*(save(c) for c in conversations))
+
     async def fetch_conversation(self, identifier: int) -> Conversation:
         status, return_data = await self._make_get_request(
             self.base_url + f"conversation/get/?id={identifier}"
@@ -159,6 +216,13 @@ class ApiStore(DataStore):
 
         return Helper(**return_data)
 
+    async def fetch_data_version(self) -> int:
+        """
+        The server has no change counter, but it updates helper
+        totals as conversations are created so the count will do
+        """
+        return await self.fetch_current_conversation_count()
+
     # noinspection PyMethodOverriding
     async def store_helper(
         self, helper: Helper, username: str, password: str, is_helper: bool = False
@@ -195,26 +259,175 @@ class ApiStore(DataStore):
 
         conversations = []
         for conversation in return_data:
-            conversation["identifier"] = conversation.pop("id")
-            conversation["start_time"] = self._convert_to_datetime(
-                conversation["start_time"]
+            conversations.append(self._build_conversation(conversation))
+
+        return conversations
+
+    async def iter_conversations(
+        self,
+        batch_size: int = 500,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> AsyncIterator[Conversation]:
+        """Pages through conversations using ``after`` and ``limit`` query params.
+
+        Time bounds are also applied locally, and if the server
+        ignores paging and answers with everything at once we
+        just yield from that single page
+        """
+        async for page in self._iter_pages(batch_size):
+            for conversation in page:
+                conversation = self._build_conversation(conversation)
+                if since is not None and conversation.start_time < since:
+                    continue
+                if until is not None and conversation.start_time >= until:
+                    continue
+
+                yield conversation
+
+    async def _iter_pages(self, batch_size: int) -> AsyncIterator[List[dict]]:
+        """Yields each page of conversations as the server sent them"""
+        after = -1
+        while True:
+            query = urlencode({"after": after, "limit": batch_size})
+            status, return_data = await self._make_get_request(
+                self.base_url + f"conversation/get/all/?{query}"
             )
-            conversation["end_time"] = self._convert_to_datetime(
-                conversation["end_time"]
+            assert status == 200
+
+            page_after = after
+            page = []
+            for conversation in return_data:
+                if conversation["id"] <= page_after:
+                    # The server ignored ``after``, so we've seen the rest
+                    if page:
+                        yield page
+                    return
+
+                after = max(after, conversation["id"])
+                page.append(conversation)
+
+            if page:
+                yield page
+
+            if len(return_data) != batch_size:
+                # Either the last page, or paging isn't supported
+                return
+
+    def _dump_conversation(self, conversation: Conversation) -> dict:
+        data = asdict(conversation, recurse=True)
+
+        data["start_time"] = self._convert_from_datetime(data["start_time"])
+        data["end_time"] = self._convert_from_datetime(data["end_time"])
+
+        for m in data["messages"]:
+            m["timestamp"] = self._convert_from_datetime(m["timestamp"])
+            m["content"] = (
+                "" if self.content_policy is ContentPolicy.NONE else str(m["content"])
             )
 
-            messages = []
-            for m in conversation["messages"]:
-                m.pop("id")
-                m.pop("conversation")
-                m["timestamp"] = self._convert_to_datetime(m["timestamp"])
-                messages.append(Message(**m))
+        return data
 
-            conversation["messages"] = messages
+    def _build_conversation(self, conversation: dict) -> Conversation:
+        conversation["identifier"] = conversation.pop("id")
+        conversation["start_time"] = self._convert_to_datetime(
+            conversation["start_time"]
+        )
+        conversation["end_time"] = self._convert_to_datetime(conversation["end_time"])
 
-            conversations.append(Conversation(**conversation))
+        messages = []
+        for m in conversation["messages"]:
+            m.pop("id")
+            m.pop("conversation")
+            m["timestamp"] = self._convert_to_datetime(m["timestamp"])
+            messages.append(Message(**m))
 
-        return conversations
+        conversation["messages"] = messages
+
+        return Conversation(**conversation)
+
+    async def fetch_conversation_batch(
+        self,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> ConversationBatch:
+        """
+        The API only returns whole conversations, so each page is laid
+        out as a batch straight from its JSON and the pages are joined
+        """
+        since = None if since is None else to_micros(since)
+        until = None if until is None else to_micros(until)
+
+        batches = []
+        async for page in self._iter_pages(500):
+            columns = [[] for _ in range(8)]
+            for conversation in sorted(page, key=lambda c: c["id"]):
+                start_time = to_micros(
+                    self._convert_to_datetime(conversation["start_time"])
+                )
+                if since is not None and start_time < since:
+                    continue
+                if until is not None and start_time >= until:
+                    continue
+
+                columns[0].append(conversation["id"])
+                columns[1].append(start_time)
+                columns[2].append(
+                    to_micros(self._convert_to_datetime(conversation["end_time"]))
+                )
+                columns[3].append(conversation["channel_id"])
+                for message in conversation["messages"]:
+                    columns[4].append(conversation["id"])
+                    columns[5].append(message["author_id"])
+                    columns[6].append(
+                        to_micros(self._convert_to_datetime(message["timestamp"]))
+                    )
+                    columns[7].append(message["is_helper"])
+
+            batches.append(ConversationBatch.from_columns(*columns))
+
+        return ConversationBatch.concatenate(batches)
+
+    async def fetch_conversation_metrics(
+        self,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> List[ConversationMetrics]:
+        """The API doesn't store metrics, so work them out while paging through"""
+        return [
+            ConversationMetrics.from_conversation(conversation)
+            async for conversation in self.iter_conversations(since=since, until=until)
+        ]
+
+    async def fetch_message_summary(self) -> MessageSummary:
+        """The API has no aggregate endpoint, so count while paging through"""
+        total_messages = 0
+        total_helper_messages = 0
+        authors = set()
+        async for conversation in self.iter_conversations():
+            for message in conversation.messages:
+                total_messages += 1
+                total_helper_messages += 1 if message.is_helper else 0
+                authors.add(message.author_id)
+
+        return MessageSummary(
+            total_messages=total_messages,
+            total_authors=len(authors),
+            total_helper_messages=total_helper_messages,
+        )
+
+    async def fetch_checkpoint(self, channel_id: int) -> Optional[Checkpoint]:
+        """The API has nowhere to keep checkpoints, so backfills start from scratch"""
+        raise NotImplementedError
+
+    async def store_checkpoint(self, checkpoint: Checkpoint) -> None:
+        raise NotImplementedError
+
+    async def apply_helper_deltas(
+        self, deltas: List[HelperDelta], checkpoint: Optional[Checkpoint] = None
+    ) -> None:
+        """The API has no endpoint for incrementing helper totals"""
+        raise NotImplementedError
 
     async def fetch_all_helpers(self) -> List[Helper]:
         status, return_data = await self._make_get_request(
@@ -1,48 +1,148 @@
 import datetime
-from typing import List, Union
+from typing import List, Union, Optional, AsyncIterator
 
 import attr
 import pymongo
+from pymongo.errors import OperationFailure
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from .document import Document
-from ... import Helper, Conversation, Message
+from ... import (
+    Helper,
+    Conversation,
+    Message,
+    MessageSummary,
+    Checkpoint,
+    HelperDelta,
+    ContentPolicy,
+    ConversationMetrics,
+)
 from ...abc import DataStore
+from ...batch import ConversationBatch, to_micros
+from ...content import encode_content, decode_content
 
 
 class Mongo(DataStore):
-    def __init__(self, connection_string):
-        self.db = AsyncIOMotorClient(connection_string).stats
+    # How many applied delta batches each helper remembers
+    APPLIED_DELTAS_KEPT = 100
+
+    def __init__(
+        self,
+        connection_string,
+        *,
+        content_policy: ContentPolicy = ContentPolicy.FULL,
+    ):
+        self.content_policy = content_policy
+        self.client = AsyncIOMotorClient(connection_string)
+        self.db = self.client.stats
 
         self.conversations = Document(self.db, "conversations")
         self.helpers = Document(self.db, "helpers")
+        self.checkpoints = Document(self.db, "checkpoints")
+        self.counters = Document(self.db, "counters")
+
+        # Transactions need a replica set, see apply_helper_deltas
+        self.supports_transactions = True
 
     async def create_indexes(self):
-        """Creates indexes for faster lookup"""
+        """
+        Creates indexes for faster lookup. Conversations are read in
+        identifier order, which without an index is an in-memory sort
+        of whole documents that a long history soon outgrows
+        """
         await self.conversations.create_index("identifier", pymongo.ASCENDING)
+        await self.conversations.db.create_index(
+            [("first_message_id", pymongo.ASCENDING)], unique=True
+        )
         await self.helpers.create_index("identifier", pymongo.ASCENDING)
+        await self.checkpoints.create_index("channel_id", pymongo.ASCENDING)
 
-    async def save_conversation(self, conversation: Conversation) -> None:
-        as_dict = attr.asdict(conversation, recurse=True)
-        as_dict.pop("identifier")
+    async def open(self) -> None:
+        """
+        Creates the indexes, first folding away conversations stored
+        more than once before first_message_id had a unique index
+        """
+        indexes = await self.conversations.db.index_information()
+        if "first_message_id_1" not in indexes:
+            await self._fold_duplicate_conversations()
 
-        filter_dict = {"identifier": conversation.identifier}
-        await self.conversations.upsert(filter_dict, as_dict)
+        await self.create_indexes()
 
-    async def fetch_conversation(self, identifier: int) -> Conversation:
-        convo = await self.conversations.find({"identifier": identifier})
-        messages = []
-        for message in convo["messages"]:
-            messages.append(Message(**message))
+    async def _fold_duplicate_conversations(self) -> None:
+        """
+        Re-running a backfill used to store every conversation again
+        under a new identifier, keep the copy with the lowest one
+        """
+        duplicates = self.conversations.db.aggregate(
+            [
+                {
+                    "$group": {
+                        "_id": "$first_message_id",
+                        "identifier": {"$min": "$identifier"},
+                        "copies": {"$sum": 1},
+                    }
+                },
+                {"$match": {"copies": {"$gt": 1}}},
+            ],
+            allowDiskUse=True,
+        )
+        operations = [
+            pymongo.DeleteMany(
+                {
+                    "first_message_id": duplicate["_id"],
+                    "identifier": {"$ne": duplicate["identifier"]},
+                }
+            )
+            async for duplicate in duplicates
+        ]
+        if operations:
+            await self.conversations.db.bulk_write(operations, ordered=False)
+            await self._bump_data_version()
 
-        convo["messages"] = messages
+    async def close(self) -> None:
+        self.client.close()
 
-        convo.pop("_id")
+    async def save_conversation(self, conversation: Conversation) -> None:
+        await self.save_conversations([conversation])
 
-        return Conversation(**convo)
+    async def save_conversations(self, conversations: List[Conversation]) -> None:
+        """
+        A conversation is known by its first message, so one replayed after
+        a crash under a new identifier leaves the stored copy as it is
+        """
+        if not conversations:
+            return
+
+        operations = []
+        for conversation in conversations:
+            as_dict = self._dump_conversation(conversation)
+            as_dict["identifier"] = conversation.identifier
+            operations.append(
+                pymongo.UpdateOne(
+                    {"first_message_id": conversation.first_message_id},
+                    {"$setOnInsert": as_dict},
+                    upsert=True,
+                )
+            )
+
+        await self.conversations.db.bulk_write(operations, ordered=False)
+        await self._bump_data_version()
+
+    async def fetch_conversation(self, identifier: int) -> Conversation:
+        convo = await self.conversations.find({"identifier": identifier})
+        return self._build_conversation(convo)
 
     async def fetch_current_conversation_count(self) -> int:
-        return await self.conversations.get_document_count()
+        # The next free identifier, which isn't the document count
+        # once a lost batch has left a gap in the identifiers
+        latest = await self.conversations.db.find_one(
+            {}, sort=[("identifier", pymongo.DESCENDING)]
+        )
+        return latest["identifier"] + 1 if latest else 0
+
+    async def fetch_data_version(self) -> int:
+        counter = await self.counters.db.find_one({"_id": "data_version"})
+        return counter["version"] if counter else 0
 
     async def fetch_helpers(self) -> List[Helper]:
         raw_helpers = await self.helpers.get_all()
@@ -71,6 +171,7 @@ class Mongo(DataStore):
         # try:
         helper = await self.helpers.find_by_custom({"identifier": identifier})
         helper.pop("_id")
+        helper.pop("applied_deltas", None)
         return Helper(**helper)
         # except:
         #   return None
@@ -84,6 +185,7 @@ class Mongo(DataStore):
 
         filter_dict = {"identifier": helper.identifier}
         await self.helpers.upsert(filter_dict, as_dict)
+        await self._bump_data_version()
 
     async def remove_helper(self, identifier: int) -> None:
         pass
@@ -92,22 +194,349 @@ class Mongo(DataStore):
         values = await self.conversations.get_all()
         conversations = []
         for convo in values:
-            messages = []
+            conversations.append(self._build_conversation(convo))
+
+        return conversations
+
+    async def iter_conversations(
+        self,
+        batch_size: int = 500,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> AsyncIterator[Conversation]:
+        filter_dict = self._time_filter(since, until)
+
+        cursor = self.conversations.db.find(
+            filter_dict, batch_size=batch_size
+        ).sort("identifier", pymongo.ASCENDING)
+        async for convo in cursor:
+            yield self._build_conversation(convo)
+
+    async def fetch_conversation_batch(
+        self,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> ConversationBatch:
+        filter_dict = self._time_filter(since, until)
+
+        # Leave content on the server, it's most of every document
+        projection = {
+            "_id": 0,
+            "identifier": 1,
+            "start_time": 1,
+            "end_time": 1,
+            "channel_id": 1,
+            "messages.author_id": 1,
+            "messages.timestamp": 1,
+            "messages.is_helper": 1,
+        }
+        columns = [[] for _ in range(8)]
+        cursor = self.conversations.db.find(filter_dict, projection).sort(
+            "identifier", pymongo.ASCENDING
+        )
+        async for convo in cursor:
+            columns[0].append(convo["identifier"])
+            columns[1].append(to_micros(convo["start_time"]))
+            columns[2].append(to_micros(convo["end_time"]))
+            columns[3].append(convo["channel_id"])
             for message in convo["messages"]:
-                messages.append(Message(**message))
+                columns[4].append(convo["identifier"])
+                columns[5].append(message["author_id"])
+                columns[6].append(to_micros(message["timestamp"]))
+                columns[7].append(message["is_helper"])
 
-            convo["messages"] = messages
-            convo.pop("_id")
+        return ConversationBatch.from_columns(*columns)
 
-            conversations.append(Conversation(**convo))
+    async def fetch_conversation_metrics(
+        self,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> List[ConversationMetrics]:
+        filter_dict = self._time_filter(since, until)
 
-        return conversations
+        projection = {
+            "_id": 0,
+            "identifier": 1,
+            "start_time": 1,
+            "end_time": 1,
+            "channel_id": 1,
+            "metrics": 1,
+        }
+        metrics = {}
+        order = []
+        stale = []
+        cursor = self.conversations.db.find(filter_dict, projection).sort(
+            "identifier", pymongo.ASCENDING
+        )
+        async for convo in cursor:
+            order.append(convo["identifier"])
+            if "metrics" in convo:
+                metrics[convo["identifier"]] = self._build_metrics(convo)
+            else:
+                # Saved before metrics were, so work them out from messages
+                stale.append(convo["identifier"])
+
+        if stale:
+            async for convo in self.conversations.db.find(
+                {"identifier": {"$in": stale}}
+            ):
+                conversation = self._build_conversation(convo)
+                metrics[conversation.identifier] = (
+                    ConversationMetrics.from_conversation(conversation)
+                )
+
+        return [metrics[identifier] for identifier in order]
+
+    async def fetch_checkpoint(self, channel_id: int) -> Optional[Checkpoint]:
+        checkpoint = await self.checkpoints.find({"channel_id": channel_id})
+        if not checkpoint:
+            return None
+
+        conversation = checkpoint["conversation"]
+        return Checkpoint(
+            channel_id=channel_id,
+            last_message_id=checkpoint["last_message_id"],
+            conversation=self._build_conversation(conversation)
+            if conversation
+            else None,
+            # Stored as pairs since document keys must be strings
+            current_helpers={
+                helper_id: amount
+                for helper_id, amount in checkpoint["current_helpers"]
+            },
+        )
+
+    async def store_checkpoint(self, checkpoint: Checkpoint) -> None:
+        filter_dict = {"channel_id": checkpoint.channel_id}
+        await self.checkpoints.upsert(filter_dict, self._dump_checkpoint(checkpoint))
+
+    async def apply_helper_deltas(
+        self, deltas: List[HelperDelta], checkpoint: Optional[Checkpoint] = None
+    ) -> None:
+        """
+        Writes the deltas and checkpoint in one transaction where the
+        deployment supports them. A standalone server can't, so there
+        the deltas are written first, and each helper records the batch
+        so replaying it after a crash before the checkpoint lands is a no-op
+        """
+        if self.supports_transactions:
+            try:
+                async with await self.client.start_session() as session:
+                    async with session.start_transaction():
+                        await self._write_helper_deltas(deltas, checkpoint, session)
+                return
+            except OperationFailure as e:
+                # IllegalOperation, this isn't a replica set or mongos
+                if e.code != 20:
+                    raise
+
+                self.supports_transactions = False
+
+        await self._write_helper_deltas(deltas, checkpoint)
+
+    async def _write_helper_deltas(
+        self, deltas: List[HelperDelta], checkpoint: Optional[Checkpoint], session=None
+    ) -> None:
+        # Each helper remembers the checkpoints whose deltas it has taken,
+        # so a batch retried after a crash before its checkpoint landed
+        # leaves it alone. Every update is atomic on its own document
+        filter_dict = {}
+        push = {}
+        if checkpoint is not None:
+            batch = f"{checkpoint.channel_id}:{checkpoint.last_message_id}"
+            filter_dict = {"applied_deltas": {"$ne": batch}}
+            push = {
+                "applied_deltas": {
+                    "$each": [batch],
+                    "$slice": -self.APPLIED_DELTAS_KEPT,
+                }
+            }
+
+        operations = [
+            pymongo.UpdateOne(
+                {"identifier": delta.identifier, **filter_dict},
+                {
+                    "$inc": {
+                        "total_messages": delta.total_messages,
+                        "total_conversations": delta.total_conversations,
+                    },
+                    "$push": {
+                        "messages_per_conversation": {
+                            "$each": delta.messages_per_conversation
+                        },
+                        "conversation_length": {
+                            "$each": [
+                                length.total_seconds()
+                                for length in delta.conversation_length
+                            ]
+                        },
+                        **push,
+                    },
+                },
+            )
+            for delta in deltas
+        ]
+        if operations:
+            await self.helpers.db.bulk_write(
+                operations, ordered=False, session=session
+            )
+
+        if checkpoint is not None:
+            await self.checkpoints.db.update_one(
+                {"channel_id": checkpoint.channel_id},
+                {"$set": self._dump_checkpoint(checkpoint)},
+                upsert=True,
+                session=session,
+            )
+
+        await self._bump_data_version(session)
+
+    async def _bump_data_version(self, session=None) -> None:
+        """Marks conversations or helpers as changed, see fetch_data_version"""
+        await self.counters.db.update_one(
+            {"_id": "data_version"},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            session=session,
+        )
+
+    async def compact_content(self, batch_size: int = 500) -> None:
+        """
+        Rewrites the content of every stored message to match content_policy.
+        Run the server's compact command afterwards to hand the space back
+        """
+        operations = []
+        async for convo in self.conversations.db.find({}, {"messages": 1}):
+            messages = convo["messages"]
+            for message in messages:
+                message["content"] = encode_content(
+                    decode_content(message["content"]), self.content_policy
+                )
+
+            operations.append(
+                pymongo.UpdateOne(
+                    {"_id": convo["_id"]}, {"$set": {"messages": messages}}
+                )
+            )
+            if len(operations) >= batch_size:
+                await self.conversations.db.bulk_write(operations, ordered=False)
+                operations = []
+
+        if operations:
+            await self.conversations.db.bulk_write(operations, ordered=False)
+
+    def _dump_conversation(self, conversation: Conversation) -> dict:
+        as_dict = attr.asdict(conversation, recurse=True)
+        as_dict.pop("identifier")
+        for message in as_dict["messages"]:
+            message["content"] = encode_content(
+                message["content"], self.content_policy
+            )
+
+        metrics = ConversationMetrics.from_conversation(conversation)
+        as_dict["metrics"] = {
+            "helper_messages": metrics.helper_messages,
+            "helpee_messages": metrics.helpee_messages,
+            "helper_ids": list(metrics.helper_ids),
+            "first_response_time": None
+            if metrics.first_response_time is None
+            else metrics.first_response_time.total_seconds(),
+        }
+
+        return as_dict
+
+    @staticmethod
+    def _time_filter(
+        since: Optional[datetime.datetime], until: Optional[datetime.datetime]
+    ) -> dict:
+        """Builds a query matching conversations started within a time range"""
+        filter_dict = {}
+        if since is not None:
+            filter_dict.setdefault("start_time", {})["$gte"] = since
+        if until is not None:
+            filter_dict.setdefault("start_time", {})["$lt"] = until
+
+        return filter_dict
+
+    @staticmethod
+    def _build_metrics(convo: dict) -> ConversationMetrics:
+        stored = convo["metrics"]
+        first_response_time = stored["first_response_time"]
+        return ConversationMetrics(
+            identifier=convo["identifier"],
+            channel_id=convo["channel_id"],
+            start_time=convo["start_time"],
+            end_time=convo["end_time"],
+            helper_messages=stored["helper_messages"],
+            helpee_messages=stored["helpee_messages"],
+            helper_ids=stored["helper_ids"],
+            first_response_time=None
+            if first_response_time is None
+            else datetime.timedelta(seconds=first_response_time),
+        )
+
+    @staticmethod
+    def _dump_checkpoint(checkpoint: Checkpoint) -> dict:
+        conversation = checkpoint.conversation
+        return {
+            "last_message_id": checkpoint.last_message_id,
+            "conversation": attr.asdict(conversation, recurse=True)
+            if conversation
+            else None,
+            "current_helpers": list(checkpoint.current_helpers.items()),
+        }
+
+    @staticmethod
+    def _build_conversation(convo: dict) -> Conversation:
+        messages = []
+        for message in convo["messages"]:
+            message["content"] = decode_content(message["content"])
+            messages.append(Message(**message))
+
+        convo["messages"] = messages
+        convo.pop("_id", None)
+        convo.pop("metrics", None)
+
+        return Conversation(**convo)
+
+    async def fetch_message_summary(self) -> MessageSummary:
+        pipeline = [
+            {"$unwind": "$messages"},
+            {
+                "$group": {
+                    "_id": "$messages.author_id",
+                    "messages": {"$sum": 1},
+                    "helper_messages": {
+                        "$sum": {"$cond": ["$messages.is_helper", 1, 0]}
+                    },
+                }
+            },
+            {
+                "$group": {
+                    "_id": None,
+                    "total_messages": {"$sum": "$messages"},
+                    "total_authors": {"$sum": 1},
+                    "total_helper_messages": {"$sum": "$helper_messages"},
+                }
+            },
+        ]
+        result = await self.conversations.db.aggregate(pipeline).to_list(1)
+        if not result:
+            return MessageSummary(0, 0, 0)
+
+        result = result[0]
+        return MessageSummary(
+            total_messages=result["total_messages"],
+            total_authors=result["total_authors"],
+            total_helper_messages=result["total_helper_messages"],
+        )
 
     async def fetch_all_helpers(self) -> List[Helper]:
         values = await self.helpers.get_all()
         helpers = []
         for helper in values:
             helper.pop("_id")
+            helper.pop("applied_deltas", None)
             helpers.append(Helper(**helper))
 
         return helpers
@@ -1 +1,2 @@
 from .sqlite import Sqlite
+from .profile import PragmaProfile
@@ -0,0 +1,297 @@
+"""
+Versioned schema migrations for the Sqlite datastore.
+
+The schema version lives in ``PRAGMA user_version``. Every entry in
+``MIGRATIONS`` moves the database up by exactly one version, so the
+n-th script (starting from 1) produces schema version n. To change
+the schema, append a new script; never edit one that has shipped.
+"""
+from typing import List, Optional
+
+import aiosqlite
+
+MIGRATIONS: List[str] = [
+    # 1: The original tables. IF NOT EXISTS lets this adopt databases
+    #    created before migrations were tracked.
+    """
+    CREATE TABLE IF NOT EXISTS Message (
+        message_id INTEGER NOT NULL PRIMARY KEY,
+        author_id INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        is_helper INTEGER NOT NULL,
+        content TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        conversation_id INTEGER,
+        FOREIGN KEY (conversation_id) REFERENCES Conversation (identifier)
+    );
+    CREATE TABLE IF NOT EXISTS Conversation (
+        identifier INTEGER PRIMARY KEY,
+        first_message_id INTEGER NOT NULL,
+        last_message_id INTEGER NOT NULL,
+        user_being_helped INTEGER NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT NOT NULL,
+        guild_id INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL,
+        topic TEXT
+    );
+    CREATE TABLE IF NOT EXISTS Helper (
+        identifier number NOT NULL PRIMARY KEY,
+        total_messages number NOT NULL,
+        total_conversations number NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS Helper_messages_per (
+        helper_id number NOT NULL,
+        amount INTEGER NOT NULL,
+        PRIMARY KEY (helper_id, amount),
+        FOREIGN KEY (helper_id) REFERENCES Helper(identifier)
+    );
+    CREATE TABLE IF NOT EXISTS Helper_convo_length (
+        helper_id number NOT NULL,
+        time INTEGER NOT NULL,
+        PRIMARY KEY (helper_id, time),
+        FOREIGN KEY (helper_id) REFERENCES Helper(identifier)
+    );
+    """,
+    # 2: Secondary indexes for per conversation, per author and time range lookups
+    """
+    CREATE INDEX IF NOT EXISTS Message_conversation_id
+        ON Message (conversation_id);
+    CREATE INDEX IF NOT EXISTS Message_author_id_timestamp
+        ON Message (author_id, timestamp);
+    CREATE INDEX IF NOT EXISTS Conversation_start_time
+        ON Conversation (start_time);
+    """,
+    # 3: Store timestamps as INTEGER microseconds since the unix epoch (UTC)
+    #    instead of datetime() TEXT. Sqlite can't change a column's type in
+    #    place, so both tables are rebuilt and their indexes recreated.
+    """
+    CREATE TABLE Conversation_new (
+        identifier INTEGER PRIMARY KEY,
+        first_message_id INTEGER NOT NULL,
+        last_message_id INTEGER NOT NULL,
+        user_being_helped INTEGER NOT NULL,
+        start_time INTEGER NOT NULL,
+        end_time INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL,
+        topic TEXT
+    );
+    INSERT INTO Conversation_new
+        SELECT
+            identifier, first_message_id, last_message_id, user_being_helped,
+            CAST(strftime('%s', start_time) AS INTEGER) * 1000000,
+            CAST(strftime('%s', end_time) AS INTEGER) * 1000000,
+            guild_id, channel_id, topic
+        FROM Conversation;
+    DROP TABLE Conversation;
+    ALTER TABLE Conversation_new RENAME TO Conversation;
+    CREATE INDEX Conversation_start_time ON Conversation (start_time);
+
+    CREATE TABLE Message_new (
+        message_id INTEGER NOT NULL PRIMARY KEY,
+        author_id INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        is_helper INTEGER NOT NULL,
+        content TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        conversation_id INTEGER,
+        FOREIGN KEY (conversation_id) REFERENCES Conversation (identifier)
+    );
+    INSERT INTO Message_new
+        SELECT
+            message_id, author_id, channel_id, guild_id, is_helper, content,
+            CAST(strftime('%s', timestamp) AS INTEGER) * 1000000,
+            conversation_id
+        FROM Message;
+    DROP TABLE Message;
+    ALTER TABLE Message_new RENAME TO Message;
+    CREATE INDEX Message_conversation_id ON Message (conversation_id);
+    CREATE INDEX Message_author_id_timestamp ON Message (author_id, timestamp);
+    """,
+    # 4: Per helper running aggregates of messages sent per conversation
+    #    and conversation length (seconds), backfilled from stored messages.
+    #    Bucket widths must match Helper.*_BUCKET_WIDTH and Aggregate.BUCKET_COUNT
+    """
+    CREATE TABLE Helper_stats (
+        helper_id INTEGER NOT NULL,
+        metric TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        total REAL NOT NULL,
+        total_squares REAL NOT NULL,
+        minimum REAL NOT NULL,
+        maximum REAL NOT NULL,
+        PRIMARY KEY (helper_id, metric)
+    ) WITHOUT ROWID;
+    CREATE TABLE Helper_stats_bucket (
+        helper_id INTEGER NOT NULL,
+        metric TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (helper_id, metric, bucket)
+    ) WITHOUT ROWID;
+
+    CREATE TEMP TABLE Helper_conversation AS
+        SELECT
+            M.author_id AS helper_id,
+            'messages' AS metric,
+            COUNT(*) AS value,
+            MIN(COUNT(*) / 1, 99) AS bucket
+        FROM Message M
+        WHERE M.is_helper
+        GROUP BY M.conversation_id, M.author_id;
+    INSERT INTO Helper_conversation
+        SELECT
+            M.author_id,
+            'length',
+            (C.end_time - C.start_time) / 1000000.0,
+            MIN(CAST((C.end_time - C.start_time) / 300000000 AS INTEGER), 99)
+        FROM Message M
+        JOIN Conversation C ON C.identifier = M.conversation_id
+        WHERE M.is_helper
+        GROUP BY M.conversation_id, M.author_id;
+
+    INSERT INTO Helper_stats
+        SELECT
+            helper_id, metric, COUNT(*), SUM(value),
+            SUM(value * value), MIN(value), MAX(value)
+        FROM Helper_conversation
+        GROUP BY helper_id, metric;
+    INSERT INTO Helper_stats_bucket
+        SELECT helper_id, metric, bucket, COUNT(*)
+        FROM Helper_conversation
+        GROUP BY helper_id, metric, bucket;
+    DROP TABLE Helper_conversation;
+    """,
+    # 5: Per channel backfill checkpoints, with the open conversation as JSON
+    """
+    CREATE TABLE Backfill_checkpoint (
+        channel_id INTEGER NOT NULL PRIMARY KEY,
+        last_message_id INTEGER NOT NULL,
+        state TEXT NOT NULL
+    );
+    """,
+    # 6: Per conversation metrics, worked out at save time. Durations come
+    #    from start_time and end_time, times are microseconds like them
+    """
+    ALTER TABLE Conversation ADD COLUMN helper_messages INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE Conversation ADD COLUMN helpee_messages INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE Conversation ADD COLUMN helper_ids TEXT NOT NULL DEFAULT '[]';
+    ALTER TABLE Conversation ADD COLUMN first_response_time INTEGER;
+
+    UPDATE Conversation SET
+        helper_messages = (
+            SELECT COUNT(*) FROM Message
+            WHERE conversation_id = Conversation.identifier AND is_helper
+        ),
+        helpee_messages = (
+            SELECT COUNT(*) FROM Message
+            WHERE conversation_id = Conversation.identifier AND NOT is_helper
+        ),
+        helper_ids = (
+            SELECT json_group_array(DISTINCT author_id) FROM Message
+            WHERE conversation_id = Conversation.identifier AND is_helper
+        ),
+        first_response_time = (
+            SELECT MIN(timestamp) FROM Message
+            WHERE conversation_id = Conversation.identifier AND is_helper
+        ) - start_time;
+    """,
+    # 7: A counter bumped by any change to conversations or helpers,
+    #    so anything derived from them can tell when it's stale
+    """
+    CREATE TABLE Data_version (
+        version INTEGER NOT NULL
+    );
+    INSERT INTO Data_version VALUES (0);
+
+    CREATE TRIGGER Conversation_insert_version AFTER INSERT ON Conversation
+    BEGIN UPDATE Data_version SET version = version + 1; END;
+    CREATE TRIGGER Conversation_update_version AFTER UPDATE ON Conversation
+    BEGIN UPDATE Data_version SET version = version + 1; END;
+    CREATE TRIGGER Conversation_delete_version AFTER DELETE ON Conversation
+    BEGIN UPDATE Data_version SET version = version + 1; END;
+    CREATE TRIGGER Helper_insert_version AFTER INSERT ON Helper
+    BEGIN UPDATE Data_version SET version = version + 1; END;
+    CREATE TRIGGER Helper_update_version AFTER UPDATE ON Helper
+    BEGIN UPDATE Data_version SET version = version + 1; END;
+    CREATE TRIGGER Helper_delete_version AFTER DELETE ON Helper
+    BEGIN UPDATE Data_version SET version = version + 1; END;
+    """,
+    # 8: A conversation is identified by its first message, so one replayed
+    #    after a crash isn't stored again under a new identifier. Earlier
+    #    replays are folded into the first copy before the index is built
+    """
+    CREATE TEMP TABLE Duplicate_conversation AS
+        SELECT C.identifier AS duplicate, MIN(O.identifier) AS original
+        FROM Conversation C
+        JOIN Conversation O
+            ON O.first_message_id = C.first_message_id
+            AND O.identifier < C.identifier
+        GROUP BY C.identifier;
+
+    UPDATE Message SET conversation_id = (
+        SELECT original FROM Duplicate_conversation
+        WHERE duplicate = Message.conversation_id
+    )
+    WHERE conversation_id IN (SELECT duplicate FROM Duplicate_conversation);
+    DELETE FROM Conversation
+    WHERE identifier IN (SELECT duplicate FROM Duplicate_conversation);
+    DROP TABLE Duplicate_conversation;
+
+    CREATE UNIQUE INDEX Conversation_first_message_id
+        ON Conversation (first_message_id);
+    """,
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+
+async def get_version(db: aiosqlite.Connection) -> int:
+    """Returns the schema version currently stored in the database"""
+    async with db.execute("PRAGMA user_version") as cursor:
+        row = await cursor.fetchone()
+        return row[0]
+
+
+async def migrate(db: aiosqlite.Connection, target: Optional[int] = None) -> int:
+    """
+    Brings the database up to ``target``, or the latest version.
+
+    Every pending migration is applied by a single script in a single
+    transaction along with the version bump, so the database is either
+    fully migrated or left exactly as it was.
+
+    Parameters
+    ----------
+    db : aiosqlite.Connection
+        A writable connection to migrate
+    target : Optional[int]
+        The version to stop at, defaults to LATEST_VERSION
+
+    Returns
+    -------
+    int
+        The version the database is now at
+    """
+    target = LATEST_VERSION if target is None else target
+    version = await get_version(db)
+    if version >= target:
+        return version
+
+    script = "\n".join(MIGRATIONS[version:target])
+    try:
+        await db.executescript(
+            f"BEGIN IMMEDIATE;\n{script}\nPRAGMA user_version = {target};\nCOMMIT;"
+        )
+    except Exception:
+        await db.rollback()
+        if await get_version(db) != version:
+            # Someone else migrated this file between us reading the
+            # version and taking the write lock, so start over from theirs
+            return await migrate(db, target)
+        raise
+
+    return target
@@ -0,0 +1,117 @@
+import asyncio
+import contextlib
+from typing import Dict, List, Optional, Union
+
+import aiosqlite
+
+
+class ConnectionPool:
+    """
+    A small, long lived pool of aiosqlite connections.
+
+    A single writer connection is shared behind a lock so
+    transactions never interleave, while a fixed number of
+    read only connections are handed out for queries.
+    Everything is opened once and reused until :meth:`close`
+    """
+
+    def __init__(
+        self,
+        database: str,
+        *,
+        readers: int = 4,
+        pragmas: Optional[Dict[str, Union[str, int]]] = None,
+    ):
+        if readers < 1:
+            raise ValueError("A pool requires at least one reader connection")
+
+        self.database = database
+        self.reader_count = readers
+        self.pragmas = pragmas or {}
+
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._available: Optional[asyncio.Queue] = None
+
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def open(self) -> None:
+        """Opens and configures every connection, does nothing if already open"""
+        async with self._open_lock:
+            if self.is_open:
+                return
+
+            # The writer goes first so it gets to set
+            # persistent pragmas such as journal_mode
+            writer = await self._connect()
+
+            readers = []
+            available = asyncio.Queue()
+            for _ in range(self.reader_count):
+                reader = await self._connect()
+                await reader.execute("PRAGMA query_only = ON")
+                readers.append(reader)
+                available.put_nowait(reader)
+
+            self._writer = writer
+            self._readers = readers
+            self._available = available
+
+    async def close(self) -> None:
+        """Closes every connection in the pool"""
+        async with self._open_lock:
+            if not self.is_open:
+                return
+
+            async with self._write_lock:
+                for reader in self._readers:
+                    await reader.close()
+
+                await self._writer.close()
+
+            self._writer = None
+            self._readers = []
+            self._available = None
+
+    @contextlib.asynccontextmanager
+    async def writer(self) -> aiosqlite.Connection:
+        """
+        Exclusive access to the writer connection.
+
+        Anything left uncommitted when the block
+        exits through an exception is rolled back.
+        """
+        self._ensure_open()
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+
+    @contextlib.asynccontextmanager
+    async def reader(self) -> aiosqlite.Connection:
+        """Borrow a read only connection, waiting for one if they are all in use"""
+        self._ensure_open()
+        available = self._available
+        connection = await available.get()
+        try:
+            yield connection
+        finally:
+            available.put_nowait(connection)
+
+    async def _connect(self) -> aiosqlite.Connection:
+        connection = await aiosqlite.connect(self.database)
+        for pragma, value in self.pragmas.items():
+            await connection.execute(f"PRAGMA {pragma} = {value}")
+
+        return connection
+
+    def _ensure_open(self) -> None:
+        if not self.is_open:
+            raise RuntimeError("This connection pool has not been opened yet")
@@ -0,0 +1,38 @@
+from typing import Dict, Union
+
+import attr
+
+
+@attr.s(slots=True, frozen=True)
+class PragmaProfile:
+    """
+    The pragmas every pooled Sqlite connection is opened with.
+
+    The defaults favour throughput while staying crash safe:
+    WAL lets readers keep going while the writer commits, and
+    synchronous=NORMAL only fsyncs at checkpoints under WAL.
+    """
+
+    journal_mode: str = attr.ib(default="WAL")
+    synchronous: str = attr.ib(default="NORMAL")
+    # Bytes of the database file to memory map
+    mmap_size: int = attr.ib(default=256 * 1024 * 1024)
+    # Negative values are KiB, so this is a 64MiB page cache per connection
+    cache_size: int = attr.ib(default=-64_000)
+    temp_store: str = attr.ib(default="MEMORY")
+    # Milliseconds to wait on a locked database before erroring
+    busy_timeout: int = attr.ib(default=5_000)
+
+    # Used by Sqlite.bulk_load for the duration of a backfill
+    bulk_synchronous: str = attr.ib(default="OFF")
+
+    def as_pragmas(self) -> Dict[str, Union[str, int]]:
+        """The pragmas to apply when opening a connection, busy_timeout first"""
+        return {
+            "busy_timeout": self.busy_timeout,
+            "journal_mode": self.journal_mode,
+            "synchronous": self.synchronous,
+            "mmap_size": self.mmap_size,
+            "cache_size": self.cache_size,
+            "temp_store": self.temp_store,
+        }
@@ -1,91 +1,147 @@
-import functools
+import contextlib
+import datetime
 import json
 import os
-from datetime import timedelta
+from collections import defaultdict
 from pathlib import Path
-from typing import List
+from typing import (
+    List,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import aiosqlite as aiosqlite
-from attr import asdict
-
-from conversations import Helper, Conversation, Message
+from attr import asdict, evolve
+
+from conversations import (
+    Helper,
+    Conversation,
+    Message,
+    Aggregate,
+    MessageSummary,
+    Checkpoint,
+    HelperDelta,
+    ContentPolicy,
+    ConversationMetrics,
+)
 from conversations.abc import DataStore
+from conversations.batch import EPOCH, ConversationBatch, to_micros
+from conversations.content import (
+    encode_content,
+    decode_content,
+    compress_content,
+    decompress_content,
+)
+from .migrations import migrate
+from .pool import ConnectionPool
+from .profile import PragmaProfile
 
 
-def ensure_struct(func):
-    @functools.wraps(func)
-    async def wrapped(*args, **kwargs):
-        await Sqlite._initialize(args[0].db)
-        return await func(*args, **kwargs)
-
-    return wrapped
+# The metrics kept in Helper_stats, mapped to their histogram bucket widths
+HELPER_BUCKET_WIDTHS = {
+    "messages": Helper.MESSAGES_BUCKET_WIDTH,
+    "length": Helper.LENGTH_BUCKET_WIDTH,
+}
 
 
 class Sqlite(DataStore):
-    _initialized = False
-
-    def __init__(self):
+    # Column lists shared by every query which builds dataclasses,
+    # see _build_conversation and _build_message for their order
+    _CONVERSATION_COLUMNS = (
+        "identifier, first_message_id, last_message_id, "
+        "user_being_helped, start_time, end_time, "
+        "guild_id, channel_id, topic"
+    )
+    _METRICS_COLUMNS = (
+        "helper_messages, helpee_messages, helper_ids, first_response_time"
+    )
+    _MESSAGE_COLUMNS = (
+        "author_id, channel_id, content, guild_id, "
+        "message_id, timestamp, is_helper, conversation_id"
+    )
+
+    def __init__(
+        self,
+        database: Optional[str] = None,
+        *,
+        readers: int = 4,
+        profile: Optional[PragmaProfile] = None,
+        content_policy: ContentPolicy = ContentPolicy.FULL,
+    ):
         self.cwd = self._get_path()
-
-        self.db = os.path.join(self.cwd, "datastore.db")
-
-    @ensure_struct
-    async def save_conversation(self, conversation: Conversation) -> None:
-        with open("text.json", "w") as file:
-            x = asdict(conversation)
-            x["end_time"] = x["end_time"].strftime(
-                        "%f:%S:%M:%H:%d:%m:%Y"
-                    )
-            x["start_time"] = x["start_time"].strftime(
-                        "%f:%S:%M:%H:%d:%m:%Y"
-                    )
-
-            for m in x["messages"]:
-                m["timestamp"] = m["timestamp"].strftime(
-                        "%f:%S:%M:%H:%d:%m:%Y"
+        self.content_policy = content_policy
+
+        self.db = database or os.path.join(self.cwd, "datastore.db")
+        self.profile = profile or PragmaProfile()
+        self.pool = ConnectionPool(
+            self.db,
+            readers=readers,
+            pragmas=self.profile.as_pragmas(),
+        )
+
+        # How many bulk_load blocks are currently active
+        self._bulk_loads = 0
+
+    async def open(self) -> None:
+        """
+        Opens the connection pool and brings the schema up to date.
+        Must be awaited before anything else, calling it again is harmless
+        """
+        await self.pool.open()
+
+        # Only reads the schema version when it's already current
+        async with self.pool.writer() as db:
+            await migrate(db)
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    @contextlib.asynccontextmanager
+    async def bulk_load(self) -> AsyncIterator[None]:
+        """
+        Relaxes durability on the writer for the duration of the block,
+        restoring the profile's synchronous setting once the last
+        concurrent bulk load exits.
+
+        With the default synchronous=OFF, the database survives the
+        application crashing mid load. If the operating system crashes
+        or power is lost, recent commits may be lost and the database
+        may be corrupted, so keep backups of anything that matters.
+        """
+        if self._bulk_loads == 0:
+            async with self.pool.writer() as db:
+                await db.execute(
+                    f"PRAGMA synchronous = {self.profile.bulk_synchronous}"
+                )
+        self._bulk_loads += 1
+
+        try:
+            yield
+        finally:
+            self._bulk_loads -= 1
+            if self._bulk_loads == 0:
+                async with self.pool.writer() as db:
+                    await db.execute(
+                        f"PRAGMA synchronous = {self.profile.synchronous}"
                     )
 
-            json.dump(x, file, indent=4)
+    async def save_conversation(self, conversation: Conversation) -> None:
+        await self.save_conversations([conversation])
 
-        async with aiosqlite.connect(self.db) as db:
-            await db.execute(
-                "INSERT INTO Conversation "
-                "   VALUES ("
-                "   :identifier, "
-                "   :first_message_id, "
-                "   :last_message_id, "
-                "   :user_being_helped,"
-                "   datetime(:start_time),"
-                "   datetime(:end_time),"
-                "   :guild_id,"
-                "   :channel_id,"
-                "   :topic"
-                ") ON CONFLICT DO NOTHING ",
-                {
-                    "identifier": conversation.identifier,
-                    "first_message_id": conversation.first_message_id,
-                    "last_message_id": conversation.last_message_id,
-                    "user_being_helped": conversation.user_being_helped,
-                    "start_time": conversation.start_time,
-                    "end_time": conversation.end_time,
-                    "guild_id": conversation.guild_id,
-                    "channel_id": conversation.channel_id,
-                    "topic": conversation.topic,
-                },
-            )
+    async def save_conversations(self, conversations: List[Conversation]) -> None:
+        async with self.pool.writer() as db:
+            await self._write_conversations(db, conversations)
             await db.commit()
-            await self._store_all_messages(
-                conversation.messages, conversation.identifier
-            )
 
-    @ensure_struct
     async def fetch_conversation(self, identifier: int) -> Conversation:
-        async with aiosqlite.connect(self.db) as db:
+        async with self.pool.reader() as db:
             async with db.execute(
-                "SELECT "
-                "   first_message_id, last_message_id, "
-                "   user_being_helped, datetime(start_time), "
-                "   datetime(end_time), guild_id, channel_id, topic "
+                f"SELECT {self._CONVERSATION_COLUMNS} "
                 "FROM Conversation "
                 "WHERE"
                 "   identifier=:identifier",
@@ -95,126 +151,43 @@ class Sqlite(DataStore):
                 if not value:
                     raise ValueError("Couldnt find em aye")
 
-                messages = await self._get_all_messages(identifier=identifier)
-
-                return Conversation(
-                    identifier=identifier,
-                    first_message_id=value[0],
-                    last_message_id=value[1],
-                    user_being_helped=value[2],
-                    start_time=value[3],
-                    end_time=value[4],
-                    guild_id=value[5],
-                    channel_id=value[6],
-                    topic=value[7],
-                    messages=messages,
-                )
+            messages = await self._get_all_messages(db, identifier=identifier)
+
+        return self._build_conversation(value, messages)
 
-    @ensure_struct
     async def fetch_current_conversation_count(self) -> int:
-        async with aiosqlite.connect(self.db) as db:
+        async with self.pool.reader() as db:
+            # The next free identifier, which is the count
+            # as long as identifiers have started from zero
             async with db.execute(
-                "SELECT COUNT(identifier) FROM Conversation"
+                "SELECT COALESCE(MAX(identifier) + 1, 0) FROM Conversation"
             ) as cursor:
                 val = await cursor.fetchone()
                 return val[0]
 
-    @ensure_struct
+    async def fetch_data_version(self) -> int:
+        async with self.pool.reader() as db:
+            # Bumped by triggers, see migration 7
+            async with db.execute("SELECT version FROM Data_version") as cursor:
+                val = await cursor.fetchone()
+                return val[0]
+
     async def fetch_helpers(self) -> List[Helper]:
-        async with aiosqlite.connect(self.db) as db:
-            async with db.execute(
-                "SELECT "
-                "   H.identifier, H.total_messages, "
-                "   H.total_conversations "  # , Hmp.amount, Hcl.time "
-                "FROM Helper H "
-                "LEFT JOIN Helper_messages_per Hmp"
-                "   ON Hmp.helper_id = H.identifier "
-                "LEFT JOIN Helper_convo_length Hcl "
-                "   ON H.identifier = Hcl.helper_id"
-            ) as cursor:
-                # INNER JOIN will ignore helpers without values in both tables
-                helpers = []
-                helpers_raw = await cursor.fetchall()
-                for val in helpers_raw:
-                    if len(val) == 3:
-                        val = (val[0], val[1], val[2], 0, 0)
-                    elif len(val) == 4:
-                        val = (val[0], val[1], val[2], val[3], 0)
-                    per_convo_messages = [] # [item[3] for item in val]
-                    convos = [] #[timedelta(seconds=s[4]) for s in val]
-
-                    helpers.append(
-                        Helper(
-                            identifier=val[0],
-                            total_messages=val[1],
-                            total_conversations=val[2],
-                            messages_per_conversation=per_convo_messages,
-                            conversation_length=convos,
-                        )
-                    )
+        async with self.pool.reader() as db:
+            return await self._fetch_helpers(db)
 
-        return helpers
+    async def fetch_helper(self, identifier: int) -> Union[Helper, None]:
+        async with self.pool.reader() as db:
+            helpers = await self._fetch_helpers(db, identifier)
 
-    @ensure_struct
-    async def fetch_helper(self, identifier: int) -> Helper:
-        async with aiosqlite.connect(self.db) as db:
-            async with db.execute(
-                "SELECT "
-                "   H.identifier, H.total_messages, "
-                "   H.total_conversations, Hmp.amount, Hcl.time "
-                "FROM Helper H "
-                "LEFT JOIN Helper_messages_per Hmp"
-                "   ON Hmp.helper_id = H.identifier "
-                "LEFT JOIN Helper_convo_length Hcl "
-                "   ON H.identifier = Hcl.helper_id "
-                "WHERE "
-                "   H.identifier=:identifier ",
-                {"identifier": identifier}
-                # TODO Add args here
-            ) as cursor:
-                val = await cursor.fetchone()
-                x = await cursor.fetchall()
-
-                per_convo_messages = [item[3] for item in x]
-                convos = [timedelta(seconds=s[4]) for s in x]
-
-                """
-                try:
-                    per_convo_messages = val[3]
-                except IndexError:
-                    per_convo_messages = []
-                try:
-                    print(val[4])
-                    convos = [timedelta(seconds=s) for s in val[4]]
-                except IndexError:
-                    convos = []
-                """
-
-                return Helper(
-                    identifier=val[0],
-                    total_messages=val[1],
-                    total_conversations=val[2],
-                    messages_per_conversation=per_convo_messages,
-                    conversation_length=convos,
-                )
+        return helpers[0] if helpers else None
 
-    @ensure_struct
     async def store_helper(self, helper: Helper) -> None:
-        async with aiosqlite.connect(self.db) as db:
-            # Insert each conversation counter, ignoring existing rows
-            for item in helper.messages_per_conversation:
-                await db.execute(
-                    "INSERT INTO Helper_messages_per VALUES (:helper_id, :amount) ON CONFLICT DO NOTHING ",
-                    {"helper_id": helper.identifier, "amount": item},
-                )
-
-            # Insert each conversation length, ignoring existing rows
-            for item in helper.conversation_length:
-                await db.execute(
-                    "INSERT INTO Helper_convo_length VALUES (:helper_id, :time) ON CONFLICT DO NOTHING ",
-                    {"helper_id": helper.identifier, "time": item.total_seconds()},
-                )
-
+        """
+        Stores a helper's totals. Their per conversation stats
+        live in Helper_stats, kept up to date as conversations are saved
+        """
+        async with self.pool.writer() as db:
             await db.execute(
                 "INSERT INTO Helper VALUES (:identifier, :total_messages, :total_conversations) "
                 "ON CONFLICT (identifier) DO UPDATE SET "
@@ -227,9 +200,8 @@ class Sqlite(DataStore):
             )
             await db.commit()
 
-    @ensure_struct
     async def remove_helper(self, identifier: int) -> None:
-        async with aiosqlite.connect(self.db) as db:
+        async with self.pool.writer() as db:
             args = {"identifier": identifier}
             await db.execute("DELETE FROM Helper WHERE identifier=:identifier", args)
             await db.execute(
@@ -238,213 +210,641 @@ class Sqlite(DataStore):
             await db.execute(
                 "DELETE FROM Helper_convo_length WHERE helper_id=:identifier", args
             )
+            await db.execute(
+                "DELETE FROM Helper_stats WHERE helper_id=:identifier", args
+            )
+            await db.execute(
+                "DELETE FROM Helper_stats_bucket WHERE helper_id=:identifier", args
+            )
             await db.commit()
 
-    @ensure_struct
     async def fetch_all_conversations(self) -> List[Conversation]:
-        async with aiosqlite.connect(self.db) as db:
+        async with self.pool.reader() as db:
             async with db.execute(
-                "SELECT "
-                "   first_message_id, last_message_id, "
-                "   user_being_helped, datetime(start_time), "
-                "   datetime(end_time), guild_id, channel_id, topic, identifier "
-                "FROM Conversation"
+                f"SELECT {self._CONVERSATION_COLUMNS} "
+                "FROM Conversation "
+                "ORDER BY identifier"
             ) as cursor:
-                conversations = []
                 conversations_raw = await cursor.fetchall()
-                for convo in conversations_raw:
-                    messages = await self._get_all_messages(convo[8])
-                    conversations.append(
-                        Conversation(
-                            identifier=convo[8],
-                            first_message_id=convo[0],
-                            last_message_id=convo[1],
-                            user_being_helped=convo[2],
-                            start_time=convo[3],
-                            end_time=convo[4],
-                            guild_id=convo[5],
-                            channel_id=convo[6],
-                            topic=convo[7],
-                            messages=messages,
-                        )
-                    )
 
-        return conversations
-
-    @ensure_struct
-    async def fetch_all_helpers(self) -> List[Helper]:
-        async with aiosqlite.connect(self.db) as db:
             async with db.execute(
-                "SELECT "
-                "   H.identifier, H.total_messages, "
-                "   H.total_conversations, Hmp.amount, Hcl.time "
-                "FROM Helper H "
-                "LEFT JOIN Helper_messages_per Hmp"
-                "   ON Hmp.helper_id = H.identifier "
-                "LEFT JOIN Helper_convo_length Hcl "
-                "   ON H.identifier = Hcl.helper_id "
+                f"SELECT {self._MESSAGE_COLUMNS} "
+                "FROM Message "
+                "ORDER BY conversation_id, message_id"
             ) as cursor:
-                helpers = []
-                helpers_raw = await cursor.fetchall()
-                for val in helpers_raw:
-                    per_convo_messages = [item[3] for item in val]
-                    convos = [timedelta(seconds=s[4]) for s in val]
-                    helpers.append(
-                        Helper(
-                            identifier=val[0],
-                            total_messages=val[1],
-                            total_conversations=val[2],
-                            messages_per_conversation=per_convo_messages,
-                            conversation_length=convos,
-                        )
-                    )
-        return helpers
-
-    @ensure_struct
-    async def create_indexes(self) -> None:
-        pass
-
-    async def _store_all_messages(
-        self, messages: List[Message], conversation_id: int
-    ) -> None:
-        async with aiosqlite.connect(self.db) as db:
-            for msg in messages:
-                is_helper = 1 if msg.is_helper else 0
-                await db.execute(
-                    "INSERT INTO Message VALUES ("
-                    "   :message_id, :author_id, :channel_id, "
-                    "   :guild_id, :is_helper, :content, "
-                    "   datetime(:timestamp), :conversation_id"
-                    ") ON CONFLICT DO NOTHING ",
+                messages_raw = await cursor.fetchall()
+
+        return self._build_conversations(conversations_raw, messages_raw)
+
+    async def iter_conversations(
+        self,
+        batch_size: int = 500,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> AsyncIterator[Conversation]:
+        async for chunk in self.iter_conversation_chunks(batch_size, since, until):
+            for conversation in chunk:
+                yield conversation
+
+    async def iter_conversation_chunks(
+        self,
+        chunk_size: int = 500,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> AsyncIterator[List[Conversation]]:
+        """
+        Lazily yields every conversation in lists of at most
+        ``chunk_size``, ordered by identifier.
+
+        Each chunk costs two queries no matter how many
+        conversations or messages it contains, and only one
+        chunk is held in memory at a time.
+
+        Parameters
+        ----------
+        chunk_size : int
+            The maximum amount of conversations per chunk
+        since : Optional[datetime.datetime]
+            Only include conversations starting at or after this
+        until : Optional[datetime.datetime]
+            Only include conversations starting before this
+
+        Yields
+        ------
+        List[Conversation]
+            The next chunk of conversations
+        """
+        time_filter, args = self._time_filter(since, until)
+        args["limit"] = chunk_size
+
+        last_identifier = -1
+        while True:
+            async with self.pool.reader() as db:
+                async with db.execute(
+                    f"SELECT {self._CONVERSATION_COLUMNS} "
+                    "FROM Conversation "
+                    f"WHERE identifier > :last {time_filter}"
+                    "ORDER BY identifier "
+                    "LIMIT :limit",
+                    {**args, "last": last_identifier},
+                ) as cursor:
+                    conversations_raw = await cursor.fetchall()
+
+                if not conversations_raw:
+                    return
+
+                async with db.execute(
+                    f"SELECT {self._MESSAGE_COLUMNS} "
+                    "FROM Message "
+                    "WHERE conversation_id IN ("
+                    "   SELECT identifier FROM Conversation "
+                    f"  WHERE identifier BETWEEN :first AND :last {time_filter}"
+                    ") "
+                    "ORDER BY conversation_id, message_id",
                     {
-                        "message_id": msg.message_id,
-                        "author_id": msg.author_id,
-                        "channel_id": msg.channel_id,
-                        "guild_id": msg.guild_id,
-                        "is_helper": is_helper,
-                        "content": msg.content,
-                        "timestamp": msg.timestamp,
-                        "conversation_id": conversation_id,
+                        **args,
+                        "first": conversations_raw[0][0],
+                        "last": conversations_raw[-1][0],
                     },
-                )
-            await db.commit()
+                ) as cursor:
+                    messages_raw = await cursor.fetchall()
 
-    async def _get_all_messages(self, identifier: int) -> List[Message]:
-        async with aiosqlite.connect(self.db) as db:
-            async with db.execute(
-                "SELECT "
-                "   author_id, channel_id, content,"
-                "   guild_id, message_id, datetime(timestamp), is_helper "
-                "FROM Message "
-                "WHERE"
-                "   conversation_id=:identifier",
-                {"identifier": identifier},
-            ) as messages_cursor:
-                messages = []
-                messages_raw = await messages_cursor.fetchall()
-                for val in messages_raw:
-                    messages.append(
-                        Message(
-                            author_id=val[0],
-                            channel_id=val[1],
-                            content=val[2],
-                            guild_id=val[3],
-                            message_id=val[4],
-                            timestamp=val[5],
-                            is_helper=True if val[6] else False,
-                        )
-                    )
-
-        return messages
+            last_identifier = conversations_raw[-1][0]
+            yield self._build_conversations(conversations_raw, messages_raw)
 
-    @staticmethod
-    async def _initialize(db):
-        """A static method used to make sure the relevant tables exist"""
-        if Sqlite._initialized:
-            # We are initialized
-            return
+    async def fetch_conversation_batch(
+        self,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> ConversationBatch:
+        time_filter, args = self._time_filter(since, until)
 
-        async with aiosqlite.connect(db) as db:
+        async with self.pool.reader() as db:
             async with db.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name='Message'"
+                "SELECT identifier, start_time, end_time, channel_id "
+                "FROM Conversation "
+                f"WHERE 1 {time_filter}"
+                "ORDER BY identifier",
+                args,
             ) as cursor:
-                if not await cursor.fetchone():
-                    await db.execute(
-                        "CREATE TABLE Message ("
-                        "   message_id INTEGER NOT NULL PRIMARY KEY, "
-                        "   author_id INTEGER NOT NULL,"
-                        "   channel_id INTEGER NOT NULL,"
-                        "   guild_id INTEGER NOT NULL,"
-                        "   is_helper INTEGER NOT NULL,"
-                        "   content TEXT NOT NULL,"
-                        "   timestamp TEXT NOT NULL,"
-                        "   conversation_id INTEGER,"
-                        "   FOREIGN KEY (conversation_id) REFERENCES Conversation (identifier)"
-                        ")"
-                    )
-                    await db.commit()
+                conversations_raw = await cursor.fetchall()
 
             async with db.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name='Conversation'"
+                "SELECT conversation_id, author_id, timestamp, is_helper "
+                "FROM Message "
+                "WHERE conversation_id IN ("
+                f"  SELECT identifier FROM Conversation WHERE 1 {time_filter}"
+                ") "
+                "ORDER BY conversation_id, message_id",
+                args,
             ) as cursor:
-                if not await cursor.fetchone():
-                    await db.execute(
-                        "CREATE TABLE Conversation ("
-                        "    identifier INTEGER PRIMARY KEY,"
-                        "    first_message_id INTEGER NOT NULL,"
-                        "    last_message_id INTEGER NOT NULL,"
-                        "    user_being_helped INTEGER NOT NULL,"
-                        "    start_time TEXT NOT NULL,"
-                        "    end_time TEXT NOT NULL,"
-                        "    guild_id INTEGER NOT NULL,"
-                        "    channel_id INTEGER NOT NULL,"
-                        "    topic TEXT"
-                        ")"
-                    )
-                    await db.commit()
+                messages_raw = await cursor.fetchall()
+
+        return ConversationBatch.from_columns(
+            *self._transpose(conversations_raw, 4),
+            *self._transpose(messages_raw, 4),
+        )
+
+    async def fetch_conversation_metrics(
+        self,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> List[ConversationMetrics]:
+        time_filter, args = self._time_filter(since, until)
 
+        async with self.pool.reader() as db:
             async with db.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name='Helper'"
+                "SELECT identifier, channel_id, start_time, end_time, "
+                f"  {self._METRICS_COLUMNS} "
+                "FROM Conversation "
+                f"WHERE 1 {time_filter}"
+                "ORDER BY identifier",
+                args,
             ) as cursor:
-                if not await cursor.fetchone():
-                    await db.execute(
-                        "CREATE TABLE Helper ("
-                        "   identifier number NOT NULL PRIMARY KEY, "
-                        "   total_messages number NOT NULL,"
-                        "   total_conversations number NOT NULL"
-                        ")"
-                    )
-                    await db.commit()
+                rows = await cursor.fetchall()
+
+        return [
+            ConversationMetrics(
+                identifier=row[0],
+                channel_id=row[1],
+                start_time=self._convert_from_epoch(row[2]),
+                end_time=self._convert_from_epoch(row[3]),
+                helper_messages=row[4],
+                helpee_messages=row[5],
+                helper_ids=json.loads(row[6]),
+                first_response_time=None
+                if row[7] is None
+                else datetime.timedelta(microseconds=row[7]),
+            )
+            for row in rows
+        ]
 
+    async def fetch_message_summary(self) -> MessageSummary:
+        async with self.pool.reader() as db:
             async with db.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name='Helper_messages_per'"
+                "SELECT "
+                "   COUNT(*), COUNT(DISTINCT author_id), "
+                "   COALESCE(SUM(is_helper), 0) "
+                "FROM Message"
             ) as cursor:
-                if not await cursor.fetchone():
-                    await db.execute(
-                        "CREATE TABLE Helper_messages_per ("
-                        "   helper_id number NOT NULL, "
-                        "   amount INTEGER NOT NULL,"
-                        "   PRIMARY KEY (helper_id, amount),"
-                        "   FOREIGN KEY (helper_id) REFERENCES Helper(identifier)"
-                        ")"
-                    )
-                    await db.commit()
+                val = await cursor.fetchone()
+
+        return MessageSummary(
+            total_messages=val[0],
+            total_authors=val[1],
+            total_helper_messages=val[2],
+        )
+
+    async def fetch_all_helpers(self) -> List[Helper]:
+        async with self.pool.reader() as db:
+            return await self._fetch_helpers(db)
 
+    async def fetch_checkpoint(self, channel_id: int) -> Optional[Checkpoint]:
+        async with self.pool.reader() as db:
             async with db.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name='Helper_convo_length'"
+                "SELECT last_message_id, state "
+                "FROM Backfill_checkpoint "
+                "WHERE channel_id=:channel_id",
+                {"channel_id": channel_id},
             ) as cursor:
-                if not await cursor.fetchone():
-                    await db.execute(
-                        "CREATE TABLE Helper_convo_length ("
-                        "   helper_id number NOT NULL, "
-                        "   time INTEGER NOT NULL,"
-                        "   PRIMARY KEY (helper_id, time),"
-                        "   FOREIGN KEY (helper_id) REFERENCES Helper(identifier)"
-                        ")"
+                val = await cursor.fetchone()
+
+        if not val:
+            return None
+
+        state = json.loads(val[1])
+        conversation = state["conversation"]
+        return Checkpoint(
+            channel_id=channel_id,
+            last_message_id=val[0],
+            conversation=self._load_conversation(conversation)
+            if conversation
+            else None,
+            current_helpers={
+                helper_id: amount for helper_id, amount in state["current_helpers"]
+            },
+        )
+
+    async def store_checkpoint(self, checkpoint: Checkpoint) -> None:
+        async with self.pool.writer() as db:
+            await self._write_checkpoint(db, checkpoint)
+            await db.commit()
+
+    async def apply_helper_deltas(
+        self, deltas: List[HelperDelta], checkpoint: Optional[Checkpoint] = None
+    ) -> None:
+        """
+        Per conversation stats already land in Helper_stats as
+        conversations are saved, so only the totals are added here
+        """
+        async with self.pool.writer() as db:
+            await db.executemany(
+                "UPDATE Helper SET "
+                "   total_messages = total_messages + :total_messages, "
+                "   total_conversations = total_conversations + :total_conversations "
+                "WHERE identifier=:identifier",
+                [
+                    {
+                        "identifier": delta.identifier,
+                        "total_messages": delta.total_messages,
+                        "total_conversations": delta.total_conversations,
+                    }
+                    for delta in deltas
+                ],
+            )
+            if checkpoint is not None:
+                await self._write_checkpoint(db, checkpoint)
+
+            await db.commit()
+
+    async def compact_content(self) -> None:
+        """
+        Rewrites the content of every stored message to match
+        content_policy, then vacuums to hand the space back
+        """
+        async with self.pool.writer() as db:
+            if self.content_policy is ContentPolicy.NONE:
+                await db.execute(
+                    "UPDATE Message SET content = '' WHERE content != ''"
+                )
+            elif self.content_policy is ContentPolicy.COMPRESSED:
+                await db.create_function("compress_content", 1, compress_content)
+                await db.execute(
+                    "UPDATE Message SET content = compress_content(content) "
+                    "WHERE typeof(content) = 'text' AND content != ''"
+                )
+            else:
+                await db.create_function("decompress_content", 1, decompress_content)
+                await db.execute(
+                    "UPDATE Message SET content = decompress_content(content) "
+                    "WHERE typeof(content) = 'blob'"
+                )
+
+            await db.commit()
+            await db.execute("VACUUM")
+
+    async def create_indexes(self) -> None:
+        # Indexes are part of the versioned schema, so just make sure
+        # every migration is applied and let sqlite refresh its stats
+        async with self.pool.writer() as db:
+            await migrate(db)
+            await db.execute("PRAGMA optimize")
+
+    async def _write_conversations(
+        self, db: aiosqlite.Connection, conversations: List[Conversation]
+    ) -> None:
+        """
+        Writes conversations and all of their messages with one
+        statement per table, without committing, so callers
+        can decide what goes into the transaction
+        """
+        # A conversation is known by its first message, so one replayed
+        # after a crash under a new identifier is recognised. Stored ones
+        # are left as they are, but their messages are still written under
+        # the stored identifier, as save_conversation always has
+        stored: Dict[int, int] = {}
+        async with db.execute(
+            "SELECT first_message_id, identifier FROM Conversation "
+            "WHERE first_message_id IN (SELECT value FROM json_each(:ids))",
+            {"ids": json.dumps([c.first_message_id for c in conversations])},
+        ) as cursor:
+            stored.update(await cursor.fetchall())
+
+        new_conversations = []
+        for conversation in conversations:
+            if conversation.first_message_id not in stored:
+                stored[conversation.first_message_id] = conversation.identifier
+                new_conversations.append(conversation)
+
+        conversations = [
+            conversation
+            if conversation.identifier == stored[conversation.first_message_id]
+            else evolve(
+                conversation, identifier=stored[conversation.first_message_id]
+            )
+            for conversation in conversations
+        ]
+
+        rows = []
+        for conversation in new_conversations:
+            metrics = ConversationMetrics.from_conversation(conversation)
+            rows.append(
+                {
+                    "identifier": conversation.identifier,
+                    "first_message_id": conversation.first_message_id,
+                    "last_message_id": conversation.last_message_id,
+                    "user_being_helped": conversation.user_being_helped,
+                    "start_time": self._convert_to_epoch(conversation.start_time),
+                    "end_time": self._convert_to_epoch(conversation.end_time),
+                    "guild_id": conversation.guild_id,
+                    "channel_id": conversation.channel_id,
+                    "topic": conversation.topic,
+                    "helper_messages": metrics.helper_messages,
+                    "helpee_messages": metrics.helpee_messages,
+                    "helper_ids": json.dumps(metrics.helper_ids),
+                    "first_response_time": None
+                    if metrics.first_response_time is None
+                    else metrics.first_response_time // datetime.timedelta(
+                        microseconds=1
+                    ),
+                }
+            )
+
+        await db.executemany(
+            f"INSERT INTO Conversation ({self._CONVERSATION_COLUMNS}, "
+            f"  {self._METRICS_COLUMNS}) "
+            "   VALUES ("
+            "   :identifier, "
+            "   :first_message_id, "
+            "   :last_message_id, "
+            "   :user_being_helped,"
+            "   :start_time,"
+            "   :end_time,"
+            "   :guild_id,"
+            "   :channel_id,"
+            "   :topic,"
+            "   :helper_messages,"
+            "   :helpee_messages,"
+            "   :helper_ids,"
+            "   :first_response_time"
+            ") ON CONFLICT DO NOTHING ",
+            rows,
+        )
+        await self._store_all_messages(db, conversations)
+
+        # Only count conversations we haven't seen before
+        await self._update_helper_stats(db, new_conversations)
+
+    async def _write_checkpoint(
+        self, db: aiosqlite.Connection, checkpoint: Checkpoint
+    ) -> None:
+        conversation = checkpoint.conversation
+        state = {
+            "conversation": self._dump_conversation(conversation)
+            if conversation
+            else None,
+            "current_helpers": list(checkpoint.current_helpers.items()),
+        }
+        await db.execute(
+            "INSERT INTO Backfill_checkpoint VALUES ("
+            "   :channel_id, :last_message_id, :state"
+            ") ON CONFLICT (channel_id) DO UPDATE SET "
+            "   last_message_id=:last_message_id, state=:state",
+            {
+                "channel_id": checkpoint.channel_id,
+                "last_message_id": checkpoint.last_message_id,
+                "state": json.dumps(state),
+            },
+        )
+
+    async def _update_helper_stats(
+        self, db: aiosqlite.Connection, conversations: List[Conversation]
+    ) -> None:
+        """Folds newly stored conversations into each of their helpers aggregates"""
+        bucketing = {
+            metric: Aggregate(bucket_width=width)
+            for metric, width in HELPER_BUCKET_WIDTHS.items()
+        }
+        values = []
+        for conversation in conversations:
+            helper_messages: Dict[int, int] = defaultdict(int)
+            for message in conversation.messages:
+                if message.is_helper:
+                    helper_messages[message.author_id] += 1
+
+            length = (conversation.end_time - conversation.start_time).total_seconds()
+            for helper_id, amount in helper_messages.items():
+                for metric, value in (("messages", amount), ("length", length)):
+                    values.append(
+                        {
+                            "helper_id": helper_id,
+                            "metric": metric,
+                            "value": value,
+                            "bucket": bucketing[metric].bucket_for(value),
+                        }
                     )
-                    await db.commit()
 
-        Sqlite._initialized = True
+        if not values:
+            return
+
+        await db.executemany(
+            "INSERT INTO Helper_stats VALUES ("
+            "   :helper_id, :metric, 1, :value, :value * :value, :value, :value"
+            ") ON CONFLICT (helper_id, metric) DO UPDATE SET "
+            "   count = count + 1, "
+            "   total = total + excluded.total, "
+            "   total_squares = total_squares + excluded.total_squares, "
+            "   minimum = MIN(minimum, excluded.minimum), "
+            "   maximum = MAX(maximum, excluded.maximum)",
+            values,
+        )
+        await db.executemany(
+            "INSERT INTO Helper_stats_bucket VALUES ("
+            "   :helper_id, :metric, :bucket, 1"
+            ") ON CONFLICT (helper_id, metric, bucket) DO UPDATE SET "
+            "   count = count + 1",
+            values,
+        )
+
+    async def _fetch_helpers(
+        self, db: aiosqlite.Connection, identifier: Optional[int] = None
+    ) -> List[Helper]:
+        """
+        Builds helpers along with their aggregates using one
+        query per table, optionally limited to a single helper
+        """
+        where = "" if identifier is None else "WHERE identifier=:identifier"
+        args = {"identifier": identifier}
+
+        async with db.execute(
+            "SELECT identifier, total_messages, total_conversations "
+            f"FROM Helper {where}",
+            args,
+        ) as cursor:
+            helpers_raw = await cursor.fetchall()
+
+        where = "" if identifier is None else "WHERE helper_id=:identifier"
+        aggregates: Dict[Tuple[int, str], Aggregate] = {}
+        async with db.execute(
+            "SELECT "
+            "   helper_id, metric, count, total, "
+            "   total_squares, minimum, maximum "
+            f"FROM Helper_stats {where}",
+            args,
+        ) as cursor:
+            for row in await cursor.fetchall():
+                aggregates[(row[0], row[1])] = Aggregate(
+                    *row[2:], bucket_width=HELPER_BUCKET_WIDTHS[row[1]]
+                )
+
+        async with db.execute(
+            f"SELECT helper_id, metric, bucket, count FROM Helper_stats_bucket {where}",
+            args,
+        ) as cursor:
+            for row in await cursor.fetchall():
+                aggregate = aggregates.get((row[0], row[1]))
+                if aggregate is not None:
+                    aggregate.buckets[row[2]] = row[3]
+
+        return [
+            Helper(
+                identifier=val[0],
+                total_messages=val[1],
+                total_conversations=val[2],
+                messages_aggregate=aggregates.get((val[0], "messages")),
+                length_aggregate=aggregates.get((val[0], "length")),
+            )
+            for val in helpers_raw
+        ]
+
+    async def _store_all_messages(
+        self, db: aiosqlite.Connection, conversations: List[Conversation]
+    ) -> None:
+        await db.executemany(
+            "INSERT INTO Message VALUES ("
+            "   :message_id, :author_id, :channel_id, "
+            "   :guild_id, :is_helper, :content, "
+            "   :timestamp, :conversation_id"
+            ") ON CONFLICT DO NOTHING ",
+            [
+                {
+                    "message_id": msg.message_id,
+                    "author_id": msg.author_id,
+                    "channel_id": msg.channel_id,
+                    "guild_id": msg.guild_id,
+                    "is_helper": 1 if msg.is_helper else 0,
+                    "content": encode_content(msg.content, self.content_policy),
+                    "timestamp": self._convert_to_epoch(msg.timestamp),
+                    "conversation_id": conversation.identifier,
+                }
+                for conversation in conversations
+                for msg in conversation.messages
+            ],
+        )
+
+    async def _get_all_messages(
+        self, db: aiosqlite.Connection, identifier: int
+    ) -> List[Message]:
+        async with db.execute(
+            f"SELECT {self._MESSAGE_COLUMNS} "
+            "FROM Message "
+            "WHERE"
+            "   conversation_id=:identifier "
+            "ORDER BY message_id",
+            {"identifier": identifier},
+        ) as messages_cursor:
+            messages_raw = await messages_cursor.fetchall()
+
+        return [self._build_message(val) for val in messages_raw]
+
+    @classmethod
+    def _time_filter(
+        cls,
+        since: Optional[datetime.datetime],
+        until: Optional[datetime.datetime],
+    ) -> Tuple[str, dict]:
+        """
+        Builds the conditions limiting conversations to a time range
+
+        Returns
+        -------
+        Tuple[str, dict]
+            SQL to follow a WHERE clause, each condition starting
+            with AND, and the parameters it names
+        """
+        time_filter = ""
+        args = {}
+        if since is not None:
+            time_filter += "AND start_time >= :since "
+            args["since"] = cls._convert_to_epoch(since)
+        if until is not None:
+            time_filter += "AND start_time < :until "
+            args["until"] = cls._convert_to_epoch(until)
+
+        return time_filter, args
+
+    @staticmethod
+    def _convert_to_epoch(outgoing: datetime.datetime) -> int:
+        """Given a datetime, return whole microseconds since the unix epoch in UTC"""
+        return to_micros(outgoing)
+
+    @staticmethod
+    def _convert_from_epoch(incoming: int) -> datetime.datetime:
+        """Given microseconds since the unix epoch, return a naive UTC datetime"""
+        return EPOCH + datetime.timedelta(microseconds=incoming)
+
+    @staticmethod
+    def _dump_conversation(conversation: Conversation) -> dict:
+        """Turns a conversation into JSON safe primitives, see _load_conversation"""
+        data = asdict(conversation, recurse=True)
+        data["start_time"] = Sqlite._convert_to_epoch(conversation.start_time)
+        data["end_time"] = Sqlite._convert_to_epoch(conversation.end_time)
+        for m in data["messages"]:
+            m["timestamp"] = Sqlite._convert_to_epoch(m["timestamp"])
+            m["content"] = str(m["content"])
+
+        return data
+
+    @staticmethod
+    def _load_conversation(data: dict) -> Conversation:
+        """Rebuilds a conversation made by _dump_conversation"""
+        data["start_time"] = Sqlite._convert_from_epoch(data["start_time"])
+        data["end_time"] = Sqlite._convert_from_epoch(data["end_time"])
+
+        messages = []
+        for m in data["messages"]:
+            m["timestamp"] = Sqlite._convert_from_epoch(m["timestamp"])
+            messages.append(Message(**m))
+
+        data["messages"] = messages
+        return Conversation(**data)
+
+    @staticmethod
+    def _build_message(row: Sequence) -> Message:
+        """Builds a Message from a row selected with _MESSAGE_COLUMNS"""
+        return Message(
+            author_id=row[0],
+            channel_id=row[1],
+            content=decode_content(row[2]),
+            guild_id=row[3],
+            message_id=row[4],
+            timestamp=Sqlite._convert_from_epoch(row[5]),
+            is_helper=True if row[6] else False,
+        )
+
+    @staticmethod
+    def _build_conversation(row: Sequence, messages: List[Message]) -> Conversation:
+        """Builds a Conversation from a row selected with _CONVERSATION_COLUMNS"""
+        return Conversation(
+            identifier=row[0],
+            first_message_id=row[1],
+            last_message_id=row[2],
+            user_being_helped=row[3],
+            start_time=Sqlite._convert_from_epoch(row[4]),
+            end_time=Sqlite._convert_from_epoch(row[5]),
+            guild_id=row[6],
+            channel_id=row[7],
+            topic=row[8],
+            messages=messages,
+        )
+
+    def _build_conversations(
+        self, conversations_raw: Iterable[Sequence], messages_raw: Iterable[Sequence]
+    ) -> List[Conversation]:
+        """Groups message rows under their conversation rows in one pass"""
+        messages: Dict[int, List[Message]] = defaultdict(list)
+        for row in messages_raw:
+            messages[row[7]].append(self._build_message(row))
+
+        return [
+            self._build_conversation(row, messages.get(row[0], []))
+            for row in conversations_raw
+        ]
+
+    @staticmethod
+    def _transpose(rows: List[Sequence], columns: int) -> List[Sequence]:
+        """Turns rows into columns, keeping the column count when there are none"""
+        return list(zip(*rows)) if rows else [()] * columns
 
     @staticmethod
     def _get_path() -> str:
@@ -0,0 +1,51 @@
+import datetime
+from typing import Dict, List
+
+from conversations import HelperDelta
+
+
+class HelperDeltaBuffer:
+    """
+    Accumulates increments to helpers' totals during ingest,
+    so they can be written in one go alongside the checkpoint
+    they belong to rather than one helper at a time
+    """
+
+    def __init__(self):
+        self._deltas: Dict[int, HelperDelta] = {}
+
+    def __len__(self) -> int:
+        return len(self._deltas)
+
+    def add_message(self, helper_id: int) -> None:
+        """Counts a message sent by a helper"""
+        self._get(helper_id).total_messages += 1
+
+    def add_conversation(
+        self, helper_id: int, messages: int, length: datetime.timedelta
+    ) -> None:
+        """Counts a finished conversation a helper took part in"""
+        delta = self._get(helper_id)
+        delta.total_conversations += 1
+        delta.messages_per_conversation.append(messages)
+        delta.conversation_length.append(length)
+
+    def drain(self) -> List[HelperDelta]:
+        """Returns everything accumulated so far and starts afresh"""
+        deltas, self._deltas = self._deltas, {}
+        return list(deltas.values())
+
+    def restore(self, deltas: List[HelperDelta]) -> None:
+        """Puts drained deltas back in front of anything added since"""
+        for drained in deltas:
+            delta = self._get(drained.identifier)
+            delta.total_messages += drained.total_messages
+            delta.total_conversations += drained.total_conversations
+            delta.messages_per_conversation[:0] = drained.messages_per_conversation
+            delta.conversation_length[:0] = drained.conversation_length
+
+    def _get(self, helper_id: int) -> HelperDelta:
+        if helper_id not in self._deltas:
+            self._deltas[helper_id] = HelperDelta(helper_id)
+
+        return self._deltas[helper_id]
@@ -0,0 +1,115 @@
+import asyncio
+import datetime
+from typing import AsyncIterator, List, Optional
+
+import discord
+
+# Marks the end of a shard's queue
+_DONE = object()
+
+
+async def sharded_history(
+    channel: discord.TextChannel,
+    *,
+    after: Optional[int] = None,
+    shards: int = 4,
+    buffer_size: int = 5000,
+) -> AsyncIterator[discord.Message]:
+    """
+    Yields a channel's history oldest first, exactly like
+    ``channel.history(limit=None, oldest_first=True, after=...)``,
+    while fetching it as several concurrent snowflake ranges.
+
+    Every shard is fetched into its own buffer ahead of time, but
+    they are consumed strictly in order, so whatever reads this
+    sees messages in the same order a sequential fetch gives.
+
+    Parameters
+    ----------
+    channel : discord.TextChannel
+        The channel to fetch history for
+    after : Optional[int]
+        Only fetch messages with an id greater than this
+    shards : int
+        How many ranges to fetch concurrently
+    buffer_size : int
+        How many messages each shard may fetch
+        before it has to wait for the reader
+
+    Yields
+    ------
+    discord.Message
+        The channel's messages, oldest first
+    """
+    if shards <= 1:
+        history = {"limit": None, "oldest_first": True}
+        if after is not None:
+            history["after"] = discord.Object(id=after)
+
+        async for message in channel.history(**history):
+            yield message
+
+        return
+
+    # Nothing in a channel is older than the channel itself
+    start = after if after is not None else channel.id
+    end = channel.last_message_id or discord.utils.time_snowflake(
+        datetime.datetime.utcnow()
+    )
+    step = max((end - start) // shards, 1)
+
+    # Shard i holds ids in (bounds[i], bounds[i + 1]], with the
+    # last one left open for anything sent while we're fetching
+    bounds: List[Optional[int]] = [start + step * i for i in range(shards)]
+    bounds.append(None)
+
+    queues = [asyncio.Queue(maxsize=buffer_size) for _ in range(shards)]
+    tasks = [
+        asyncio.create_task(
+            _fetch_shard(channel, queues[i], bounds[i], bounds[i + 1])
+        )
+        for i in range(shards)
+    ]
+    try:
+        for queue in queues:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _fetch_shard(
+    channel: discord.TextChannel,
+    queue: asyncio.Queue,
+    lower: int,
+    upper: Optional[int],
+) -> None:
+    # Paging forward from ``after`` only uses ``before`` to filter
+    # each page, so it would carry on to the end of the channel.
+    # Stop at the first message past the shard instead
+    history = {
+        "limit": None,
+        "oldest_first": True,
+        "after": discord.Object(id=lower),
+    }
+
+    try:
+        async for message in channel.history(**history):
+            if upper is not None and message.id > upper:
+                break
+
+            await queue.put(message)
+    except Exception as e:
+        await queue.put(e)
+        return
+
+    await queue.put(_DONE)
@@ -1,17 +1,38 @@
+import asyncio
+import collections
 import datetime
+import io
 import itertools
+import logging
 import os
+import time
 from pathlib import Path
-from typing import List
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
-import aiosqlite
 import discord
-import seaborn as sns
-from matplotlib import pyplot as plt, ticker
 
-from conversations import Conversation, Message, Helper, Plots
+from conversations import analytics
+from conversations import Helper, Plots, Checkpoint, IngestStats, HelperDelta
 from conversations.abc import DataStore
-from conversations.datastore import Sqlite
+from conversations.cache import RenderCache
+from conversations.history import sharded_history
+from conversations.pipeline import WritePipeline
+from conversations.render import Renderer
+from conversations.segmenter import Segmenter
+from conversations.tracker import LiveTracker
+
+log = logging.getLogger(__name__)
 
 
 class Manager:
@@ -21,15 +42,34 @@ class Manager:
     def __init__(self, datastore: DataStore):
         self.datastore = datastore
 
-        # A dict of Conversation,
-        # such that users being helped maps to conversations
-        self.current_conversation = {}
+        # Segments conversations as messages are sent
+        self.tracker = LiveTracker(self)
+        # Draws plots in worker processes
+        self.renderer = Renderer(workers=2, timeout=60)
+        # Rendered plots, pass a directory to keep them across restarts
+        self.render_cache = RenderCache(max_items=32)
+
+        # How backfills write conversations, see WritePipeline
+        self.backfill_writers = 4
+        self.backfill_batch_size = 32
+        # How many snowflake ranges of a channel to fetch at once
+        self.backfill_shards = 4
+        # Sealed conversations between backfill checkpoints
+        self.backfill_checkpoint_interval = 500
+
+        # Stops two backfills of the same channel from running at once
+        self._channel_locks = collections.defaultdict(asyncio.Lock)
 
         self.helpers = None
 
         self.cwd = str(Path(__file__).parents[0])
+        # Whether sent plots are also written to generated_plots
+        self.archive_plots = False
+        self._archive_lock = asyncio.Lock()
+        self._archive_tasks: Set[asyncio.Task] = set()
 
         self.has_init = False
+        self._init_lock = asyncio.Lock()
 
     async def _initialize(self):
         """
@@ -39,16 +79,22 @@ class Manager:
         if self.has_init:
             return
 
-        if not self.helpers:
-            helpers = await self.datastore.fetch_all_helpers()
+        # Concurrent backfills would otherwise each replace the helpers
+        # and restart the identifier counter under running segmenters
+        async with self._init_lock:
+            if self.has_init:
+                return
 
-            self.helpers = {}
-            for helper in helpers:
-                self.helpers[helper.identifier] = helper
+            if not self.helpers:
+                helpers = await self.datastore.fetch_all_helpers()
 
-            self.helper_ids = list(self.helpers.keys())
+                self.helpers = {}
+                for helper in helpers:
+                    self.helpers[helper.identifier] = helper
 
-        if self.conversation_identifier() == 1:
+                self.helper_ids = list(self.helpers.keys())
+
+            # Carry on from the datastore so identifiers never collide
             current_conversation_id = (
                 await self.datastore.fetch_current_conversation_count()
             )
@@ -56,264 +102,389 @@ class Manager:
                 start=current_conversation_id
             ).__next__
 
-        Path(os.path.join(self.cwd, "generated_plots", "old")).mkdir(
-            parents=True, exist_ok=True
-        )
+            self.has_init = True
 
-    async def build_past_conversations(self, channel: discord.TextChannel):
+    async def build_past_conversations(
+        self, channel: discord.TextChannel, *, stats: Optional[IngestStats] = None
+    ) -> IngestStats:
         """
         Builds & stores conversations from a given
         text channels history. Is non-interactive
         and works entirely on already sent messages
+
+        Where the datastore supports checkpoints, this resumes
+        after the last message processed by the previous run,
+        and the still open conversation is kept in the checkpoint
+        rather than saved, to be continued next time.
+
+        If the channel is being tracked live, tracking is paused
+        for the duration and picks up from where this stops
+
+        Parameters
+        ----------
+        channel : discord.TextChannel
+            The channel to backfill
+        stats : Optional[IngestStats]
+            Where to record progress as it happens,
+            useful for reporting on a long backfill
+
+        Returns
+        -------
+        IngestStats
+            How much was fetched and written, and how quickly
         """
         await self._initialize()
+        stats = stats if stats is not None else IngestStats()
+
+        async with self._channel_locks[channel.id]:
+            paused = False
+            try:
+                paused = await self.tracker.pause(channel.id)
+                async with self.datastore.bulk_load():
+                    return await self._build_past_conversations(channel, stats)
+            finally:
+                if paused:
+                    await self.tracker.resume(channel.id)
+
+    async def _build_past_conversations(
+        self, channel: discord.TextChannel, stats: IngestStats
+    ) -> IngestStats:
+        checkpoint = await self._fetch_checkpoint(channel.id)
+
+        if checkpoint:
+            # Pick up exactly where the last run left off
+            segmenter = Segmenter(
+                self.helpers,
+                self.get_next_conversation_id,
+                conversation=checkpoint.conversation,
+                current_helpers=checkpoint.current_helpers,
+            )
+        else:
+            segmenter = Segmenter(self.helpers, self.get_next_conversation_id)
 
-        conversation = None
-        finished = []
-        current_helpers = {}
-        async for message in channel.history(limit=None, oldest_first=True):
-            if (
-                (not conversation and message.author.id not in self.helper_ids)
-                and message.content
-                and not message.author.bot
-            ):
-                # Start a new conversation
-                conversation = Conversation(
-                    message.id,
-                    message.author.id,
-                    start_time=message.created_at,
-                    channel_id=message.channel.id,
-                    guild_id=message.guild.id,
-                    identifier=self.get_next_conversation_id(),
-                )
+        history = sharded_history(
+            channel,
+            after=checkpoint.last_message_id if checkpoint else None,
+            shards=self.backfill_shards,
+        )
 
-            elif (
-                conversation
-                and message.author.id != conversation.user_being_helped
-                and message.author.id not in self.helper_ids
-            ) and (message.content and not message.author.bot):
-                # Start a new conversation
-                for helper_id, msg_count in current_helpers.items():
-                    self.helpers[helper_id].conversation_length.append(
-                        conversation.end_time - conversation.start_time
-                    )
-                    self.helpers[helper_id].messages_per_conversation.append(msg_count)
-                    self.helpers[helper_id].total_conversations += 1
-
-                current_helpers = {}
-
-                await self.datastore.save_conversation(conversation)
-                finished.append(conversation)
-
-                conversation = Conversation(
-                    message.id,
-                    message.author.id,
-                    start_time=message.created_at,
-                    channel_id=message.channel.id,
-                    guild_id=message.guild.id,
-                    identifier=self.get_next_conversation_id(),
-                )
+        started_at = time.perf_counter()
+        last_message_id = None
+        async with WritePipeline(
+            self.datastore,
+            stats,
+            writers=self.backfill_writers,
+            batch_size=self.backfill_batch_size,
+        ) as pipeline:
+            sealed = 0
+            try:
+                async for message in history:
+                    stats.messages_fetched += 1
+                    last_message_id = message.id
+                    conversation = segmenter.feed(message)
+                    if not conversation:
+                        continue
 
-            if message.author.id in self.helper_ids:
-                if message.author.id not in current_helpers:
-                    current_helpers[message.author.id] = 0
-
-                current_helpers[message.author.id] += 1
-
-                helper = self.helpers[message.author.id]
-                helper.total_messages += 1
-
-            if not message.content or message.author.bot:
-                """
-                Skip the following:
-                 - Messages from bots
-                 - Messages with no content
-                """
-                continue
-
-            conversation.messages.append(
-                Message(
-                    message.author.id,
-                    message.channel.id,
-                    message.clean_content,
-                    message.guild.id,
-                    message.id,
-                    message.created_at,
-                    is_helper=True if message.author.id in self.helper_ids else False,
-                )
+                    await pipeline.put(conversation)
+
+                    sealed += 1
+                    if sealed % self.backfill_checkpoint_interval == 0:
+                        # A checkpoint may only cover conversations
+                        # which have actually been written
+                        await pipeline.join()
+                        await self._store_checkpoint(
+                            Checkpoint(
+                                channel.id,
+                                message.id,
+                                segmenter.conversation,
+                                segmenter.current_helpers,
+                            ),
+                            segmenter.deltas.drain(),
+                        )
+            finally:
+                # Stops any shards still fetching if we bail out early
+                await history.aclose()
+
+            stats.fetch_seconds = time.perf_counter() - started_at
+
+            if last_message_id is None:
+                # Nothing new since the last run
+                return stats
+
+            await pipeline.join()
+            stored = await self._store_checkpoint(
+                Checkpoint(
+                    channel.id,
+                    last_message_id,
+                    segmenter.conversation,
+                    segmenter.current_helpers,
+                ),
+                segmenter.deltas.drain(),
             )
+            if not stored:
+                # Without a checkpoint to hold on to the open conversation,
+                # finish the last convo and add it
+                conversation = segmenter.seal()
+                if conversation:
+                    await pipeline.put(conversation)
+                    await pipeline.join()
+
+        return stats
+
+    async def build_many_past_conversations(
+        self,
+        channels: Iterable[discord.TextChannel],
+        *,
+        concurrency: int = 3,
+        stats: Optional[Dict[int, IngestStats]] = None,
+    ) -> Dict[int, Union[IngestStats, Exception]]:
+        """
+        Backfills several channels at once, with at
+        most ``concurrency`` running at any one time
+
+        Parameters
+        ----------
+        channels : Iterable[discord.TextChannel]
+            The channels to backfill
+        concurrency : int
+            How many channels to backfill at once
+        stats : Optional[Dict[int, IngestStats]]
+            Filled with each channel's progress as it starts
+
+        Returns
+        -------
+        Dict[int, Union[IngestStats, Exception]]
+            Maps each channel id to its stats, or
+            the error its backfill failed with
+        """
+        channels = list(channels)
+        stats = stats if stats is not None else {}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def build(channel: discord.TextChannel) -> IngestStats:
+            async with semaphore:
+                stats[channel.id] = IngestStats()
+                return await self.build_past_conversations(
+                    channel, stats=stats[channel.id]
+                )
 
-            conversation.last_message_id = message.id
-            conversation.end_time = message.created_at
+        results = await asyncio.gather(
+            *(build(channel) for channel in channels), return_exceptions=True
+        )
+        return {channel.id: result for channel, result in zip(channels, results)}
+
+    async def _fetch_checkpoint(self, channel_id: int) -> Optional[Checkpoint]:
+        """Fetches a channel's checkpoint, if the datastore supports them"""
+        try:
+            return await self.datastore.fetch_checkpoint(channel_id)
+        except NotImplementedError:
+            return None
+
+    async def _store_checkpoint(
+        self, checkpoint: Checkpoint, deltas: Optional[List[HelperDelta]] = None
+    ) -> bool:
+        """
+        Stores a checkpoint along with the helper deltas leading up to it,
+        returning False if the datastore doesn't support checkpoints
+        """
+        if deltas is not None:
+            try:
+                await self.datastore.apply_helper_deltas(deltas, checkpoint)
+                return True
+            except NotImplementedError:
+                pass
 
-        # Finish the last convo and add it
-        await self.datastore.save_conversation(conversation)
-        finished.append(conversation)
+        try:
+            await self.datastore.store_checkpoint(checkpoint)
+        except NotImplementedError:
+            return False
 
-        # for helper in self.helpers.values():
-        # await self.datastore.store_helper(helper)
+        return True
 
-        return finished
+    async def build_timed_scatter_plot(self) -> bytes:
+        """
+        Builds and returns a plot of how many messages
+        each conversation had against how long it took
+        """
 
-    async def build_timed_scatter_plot(self):
-        conversations: List[
-            Conversation
-        ] = await self.datastore.fetch_all_conversations()  # noqa
-        messages = [len(convo.messages) for convo in conversations]
-        time = [
-            ((convo.end_time - convo.start_time).total_seconds() / 60)
-            for convo in conversations
-        ]
+        async def render() -> bytes:
+            metrics = await self.datastore.fetch_conversation_metrics()
+            return await self.renderer.render(
+                Plots.TIMED_SCATTER,
+                minutes=[metric.duration.total_seconds() / 60 for metric in metrics],
+                messages=[metric.total_messages for metric in metrics],
+            )
 
-        plt.plot(time, messages, "o", color="black")
-        plt.xlabel("Time (Minutes)")
-        plt.ylabel("Messages (Per conversations)")
-        plt.title("Time x Messages in #support")
-        plt.show()
+        return await self._render_cached(Plots.TIMED_SCATTER, (), render)
 
-    async def build_helper_convos_vs_convo_length_plot(self, guild) -> plt:
+    async def build_helper_convos_vs_convo_length_plot(self, guild) -> bytes:
         """
         Builds a plot of 'helpers' vs the average
         length of there conversations
 
         """
-        plt.clf()
-        helpers: List[Helper] = await self.datastore.fetch_all_helpers()  # noqa
-        total_conversations = [helper.total_conversations for helper in helpers]
-
-        avg_messages = [helper.messages_per_conversation for helper in helpers]
-
-        y = []
-        for msg in avg_messages:
-            y.append(sum(msg) / len(msg))
 
-        plt.plot(total_conversations, y, "o", color="black")
+        async def render() -> bytes:
+            helpers: List[Helper] = await self.datastore.fetch_all_helpers()  # noqa
+            total_conversations = [helper.total_conversations for helper in helpers]
 
-        move_amount = self.get_one_point_five_percent(max(total_conversations))
-        for i in range(len(total_conversations)):
-            user = await guild.fetch_member(helpers[i].identifier)
-            offset = total_conversations[i] + move_amount
-            plt.annotate(user.display_name, (offset, y[i]))
-
-        plt.xlabel("Total Support Conversations")
-        plt.ylabel("Average Messages Per Conversation")
-        plt.title("Total Support Conversations x Average Messages Per Convo")
+            return await self.renderer.render(
+                Plots.HELPER_CONVOS_VS_CONVO_LENGTH,
+                total_conversations=total_conversations,
+                mean_messages=[helper.mean_messages_per_convo() for helper in helpers],
+                names=await self._fetch_display_names(guild, helpers),
+                label_offset=self.get_one_point_five_percent(max(total_conversations)),
+            )
 
-        return plt
+        return await self._render_cached(
+            Plots.HELPER_CONVOS_VS_CONVO_LENGTH, (guild.id,), render
+        )
 
-    async def build_helper_convo_time_vs_total_convo_plot(self, guild) -> plt:
+    async def build_helper_convo_time_vs_total_convo_plot(self, guild) -> bytes:
         """
         Builds and returns a plot for the
         average conversation time of a helper
         plotted against total conversations
         """
-        plt.clf()
-        helpers: List[Helper] = await self.datastore.fetch_all_helpers()  # noqa
-        total_conversations = [helper.total_conversations for helper in helpers]
-        average_help_times_raw = [helper.conversation_length for helper in helpers]
-
-        average_help_times = []
-        for x in average_help_times_raw:
-            time_in_seconds = sum(x, datetime.timedelta()) / len(x)
-            time_in_minutes = round(time_in_seconds.total_seconds() / 60)
-            average_help_times.append(time_in_minutes)
-
-        plt.plot(total_conversations, average_help_times, "o", color="black")
-        plt.ylabel("Average conversation length (Minutes)")
-        plt.xlabel("Average Messages Per Conversation")
-        plt.title("Total Support Conversations x Average convo length")
-
-        move_amount = self.get_one_point_five_percent(max(total_conversations))
-        for i in range(len(total_conversations)):
-            user = await guild.fetch_member(helpers[i].identifier)
-            offset = total_conversations[i] + move_amount
-            plt.annotate(user.display_name, (offset, average_help_times[i]))
-
-        return plt
-
-    async def build_average_support_response_time(self) -> plt:
+
+        async def render() -> bytes:
+            helpers: List[Helper] = await self.datastore.fetch_all_helpers()  # noqa
+            total_conversations = [helper.total_conversations for helper in helpers]
+
+            return await self.renderer.render(
+                Plots.HELPER_CONVO_TIME_VS_CONVO_LENGTH,
+                total_conversations=total_conversations,
+                average_times=[
+                    helper.get_average_time_per_convo() for helper in helpers
+                ],
+                names=await self._fetch_display_names(guild, helpers),
+                label_offset=self.get_one_point_five_percent(max(total_conversations)),
+            )
+
+        return await self._render_cached(
+            Plots.HELPER_CONVO_TIME_VS_CONVO_LENGTH, (guild.id,), render
+        )
+
+    async def build_average_support_response_time(
+        self, threshold: Optional[float] = analytics.DEFAULT_THRESHOLD
+    ) -> bytes:
         """
         Builds and returns a plot showing the average
-        support response time
+        support response time, discarding anything
+        over ``threshold`` minutes as an outlier
         """
-        plt.clf()
-        conversations = await self.datastore.fetch_all_conversations()
-        response_times = []
-        for conversation in conversations:
-            for message in conversation.messages:
-                if message.is_helper:
-                    offset = message.timestamp - conversation.start_time
-                    time = offset.total_seconds() / 60  # Minutes
-                    if time > 100:
-                        # Fuck the outliers
-                        continue
-                    response_times.append(time)
 
-        sns.set_style("whitegrid")
-        ax = sns.histplot(data=response_times, bins=200)
-        ax.xaxis.set_major_locator(ticker.MultipleLocator(10))
-        ax.yaxis.set_major_locator(ticker.MultipleLocator(150))
+        async def render() -> bytes:
+            batch = await self.datastore.fetch_conversation_batch()
+            return await self.renderer.render(
+                Plots.AVERAGE_SUPPORT_RESPONSE_TIME,
+                response_times=analytics.response_times(batch, threshold=threshold),
+            )
+
+        return await self._render_cached(
+            Plots.AVERAGE_SUPPORT_RESPONSE_TIME, (threshold,), render
+        )
 
-        plt.xlabel("Average support response time (Minutes)")
-        plt.ylabel("Conversations")
-        plt.title("Average time taken to respond to support queries")
+    async def _render_cached(
+        self,
+        plot: Plots,
+        params: Tuple[Hashable, ...],
+        render: Callable[[], Awaitable[bytes]],
+    ) -> bytes:
+        """
+        Serves a plot from the render cache while the datastore's
+        data version hasn't moved, otherwise renders it afresh
+        """
+        try:
+            version = await self.datastore.fetch_data_version()
+        except NotImplementedError:
+            version = None
 
-        return plt
+        return await self.render_cache.fetch(plot, params, version, render)
 
-    async def get_message_stats(self) -> discord.Embed:
-        if not isinstance(self.datastore, Sqlite):
-            # TODO Get this to work with API
-            # can't call this on anything but sqlite datastore
-            raise NotImplementedError
-
-        # To run the sqlite decorator
-        await self.datastore.fetch_current_conversation_count()
-
-        messages = []
-        async with aiosqlite.connect(self.datastore.db) as db:
-            async with db.execute(
-                "SELECT "
-                "   author_id, channel_id, content,"
-                "   guild_id, message_id, datetime(timestamp), is_helper "
-                "FROM Message "
-            ) as messages_cursor:
-                all_msgs = await messages_cursor.fetchall()
-                for val in all_msgs:
-                    messages.append(
-                        Message(
-                            author_id=val[0],
-                            channel_id=val[1],
-                            content=val[2],
-                            guild_id=val[3],
-                            message_id=val[4],
-                            timestamp=val[5],
-                            is_helper=val[6],
-                        )
-                    )
+    @staticmethod
+    async def _fetch_display_names(
+        guild: discord.Guild, helpers: List[Helper]
+    ) -> List[str]:
+        names = []
+        for helper in helpers:
+            user = await guild.fetch_member(helper.identifier)
+            names.append(user.display_name)
+
+        return names
 
-        messages = set(messages)
-        unique_authors = set(msg.author_id for msg in messages)
-        total_authors = len(unique_authors)
-        total_messages = len(messages)
-        total_helper_messages = len([x for x in messages if x.is_helper])
+    async def get_message_stats(self) -> discord.Embed:
+        summary = await self.datastore.fetch_message_summary()
 
         embed = discord.Embed(
             title="Message Stats",
             description=f"""
-            Total authors: `{total_authors}`
-            Total messages: `{total_messages}`
+            Total authors: `{summary.total_authors}`
+            Total messages: `{summary.total_messages}`
             
-            Total helper messages: `{total_helper_messages}`
-            Total helpee messages: `{total_messages - total_helper_messages}`
+            Total helper messages: `{summary.total_helper_messages}`
+            Total helpee messages: `{summary.total_helpee_messages}`
             """,
         )
         # TODO humanize this
 
         return embed
 
-    @classmethod
-    def get_next_conversation_id(cls) -> int:
-        return cls.conversation_identifier()
+    async def get_response_time_stats(
+        self, guild: discord.Guild, threshold: Optional[float]
+    ) -> discord.Embed:
+        """
+        Summarises response times overall, per channel and
+        per helper, along with how long conversations
+        waited for their first response
+        """
+        batch = await self.datastore.fetch_conversation_batch()
+
+        def describe(times) -> str:
+            summary = analytics.ResponseTimeSummary.from_times(times)
+            return (
+                f"`{summary.count}` responses, mean `{summary.mean:.1f}`, "
+                f"median `{summary.median:.1f}`, 90th percentile `{summary.p90:.1f}`"
+            )
+
+        every = analytics.response_times(batch, threshold=threshold)
+        first = analytics.first_response_times(batch, threshold=threshold)
+        embed = discord.Embed(
+            title="Response Times (Minutes)",
+            description=f"""
+            All responses: {describe(every)}
+            First responses: {describe(first)}
+            """,
+        )
+
+        by_channel = analytics.response_times_by_channel(batch, threshold=threshold)
+        embed.add_field(
+            name="Per channel",
+            value="\n".join(
+                f"<#{channel_id}>: {describe(times)}"
+                for channel_id, times in by_channel.items()
+            )[:1024]
+            or "Nothing yet",
+            inline=False,
+        )
+
+        by_helper = analytics.response_times_by_helper(batch, threshold=threshold)
+        lines = []
+        for helper_id, times in by_helper.items():
+            member = guild.get_member(helper_id)
+            name = member.display_name if member else helper_id
+            lines.append(f"{name}: {describe(times)}")
+
+        embed.add_field(
+            name="Per helper",
+            value="\n".join(lines)[:1024] or "Nothing yet",
+            inline=False,
+        )
+
+        return embed
+
+    def get_next_conversation_id(self) -> int:
+        return self.conversation_identifier()
 
     @staticmethod
     def get_one_point_five_percent(total) -> int:
@@ -324,19 +495,42 @@ class Manager:
         """
         return round(total * 0.015, 2)
 
-    def save_plot(self, plot: plt, name: Plots):
-        """Saves a plot to disk"""
+    def get_plot_file(self, plot: bytes, name: Plots) -> discord.File:
+        """
+        Wraps a rendered plot for sending to discord,
+        archiving it in the background if archive_plots is set
+        """
+        if self.archive_plots:
+            task = asyncio.create_task(self._archive_plot(plot, name))
+            self._archive_tasks.add(task)
+            task.add_done_callback(self._archive_tasks.discard)
+
+        return discord.File(fp=io.BytesIO(plot), filename=name.value)
+
+    async def wait_for_archives(self) -> None:
+        """Waits for plots still being written to disk"""
+        await asyncio.gather(*self._archive_tasks, return_exceptions=True)
+
+    async def _archive_plot(self, plot: bytes, name: Plots) -> None:
+        # One at a time, as each replaces the last plot of its kind
+        async with self._archive_lock:
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, self.save_plot, plot, name)
+            except OSError:
+                log.exception("Failed to archive %s", name.name)
+
+    def save_plot(self, plot: bytes, name: Plots):
+        """Saves a rendered plot to disk, blocking while it does"""
+        Path(os.path.join(self.cwd, "generated_plots")).mkdir(
+            parents=True, exist_ok=True
+        )
         save_location = os.path.join(self.cwd, "generated_plots", name.value)
         if os.path.isfile(save_location):
             self._preserve_plot(save_location, name.name)
 
-        plot.savefig(save_location)
-
-    def get_plot_image(self, name: Plots) -> discord.File:
-        """Gets a plots image from disk and returns it for usage in discord"""
-        saved_location = os.path.join(self.cwd, "generated_plots", name.value)
-        file = discord.File(fp=saved_location, filename=name.value)
-        return file
+        with open(save_location, "wb") as file:
+            file.write(plot)
 
     def _preserve_plot(self, old_plot_dir: str, dir_name: str):
         """Preserves an old plot by moving it to a save directory"""
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from conversations import Conversation, IngestStats
+from conversations.abc import DataStore
+
+log = logging.getLogger(__name__)
+
+
+class WritePipeline:
+    """
+    The write stage of a backfill.
+
+    Sealed conversations are put on a bounded queue and written
+    by a pool of writer tasks in batches, so fetching history
+    carries on while earlier conversations are being stored.
+    A full queue makes :meth:`put` wait, which stops the fetch
+    stage from running too far ahead of the datastore.
+    """
+
+    def __init__(
+        self,
+        datastore: DataStore,
+        stats: IngestStats,
+        *,
+        writers: int = 4,
+        queue_size: int = 256,
+        batch_size: int = 32,
+    ):
+        self.datastore = datastore
+        self.stats = stats
+        self.writer_count = writers
+        self.batch_size = batch_size
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._writers: List[asyncio.Task] = []
+        self._error: Optional[BaseException] = None
+        self._started_at = time.perf_counter()
+
+    async def __aenter__(self) -> "WritePipeline":
+        self._started_at = time.perf_counter()
+        self._writers = [
+            asyncio.create_task(self._writer()) for _ in range(self.writer_count)
+        ]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                await self.join()
+        finally:
+            for writer in self._writers:
+                writer.cancel()
+
+            await asyncio.gather(*self._writers, return_exceptions=True)
+
+    async def put(self, conversation: Conversation) -> None:
+        """Queues a sealed conversation, waiting while the queue is full"""
+        self._raise_for_error()
+        await self.queue.put(conversation)
+
+    async def join(self) -> None:
+        """
+        Waits until everything queued so far has been written
+
+        Raises
+        ------
+        Exception
+            Whatever a writer failed with
+        """
+        await self.queue.join()
+        self._raise_for_error()
+        self.stats.write_seconds = time.perf_counter() - self._started_at
+
+    async def _writer(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            try:
+                if self._error is None:
+                    await self._write(batch)
+            except Exception as e:
+                # Keep draining so nothing waiting on the queue deadlocks,
+                # the error is raised from the next put or join instead
+                log.exception("Failed to write a batch of conversations")
+                self._error = e
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _write(self, batch: List[Conversation]) -> None:
+        await self.datastore.save_conversations(batch)
+
+        self.stats.conversations_written += len(batch)
+        self.stats.messages_written += sum(len(c.messages) for c in batch)
+
+    def _raise_for_error(self) -> None:
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,236 @@
+import asyncio
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+from conversations import Plots
+
+log = logging.getLogger(__name__)
+
+
+class RenderTimeout(Exception):
+    """A plot took longer than the renderer's timeout to draw"""
+
+    def __init__(self, plot: Plots, timeout: float):
+        super().__init__(f"Rendering {plot.name} took longer than {timeout:g}s")
+        self.plot = plot
+        self.timeout = timeout
+
+
+class Renderer:
+    """
+    Draws plots in a pool of worker processes, so matplotlib
+    never holds up the event loop.
+
+    Workers use the Agg backend and import matplotlib and seaborn
+    as they start. Plots are sent plain numbers and labels, and
+    come back as PNG bytes.
+
+    A worker that runs past the timeout can't be interrupted,
+    so the whole pool is replaced rather than left to drain.
+
+    Workers come from a forkserver, since forking the bot itself
+    while its datastore threads are running can deadlock the child.
+    """
+
+    def __init__(self, *, workers: int = 2, timeout: float = 60):
+        self.workers = workers
+        self.timeout = timeout
+
+        self._context = multiprocessing.get_context("forkserver")
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Each pool's workers send their pid here as they start,
+        # so a stuck pool's processes can be stopped
+        self._worker_pids: Dict[ProcessPoolExecutor, Any] = {}
+
+    async def start(self) -> None:
+        """Starts the workers and waits for them to finish importing"""
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(executor, _ping) for _ in range(self.workers))
+        )
+
+    def close(self) -> None:
+        """Stops the workers, dropping any plots still waiting to render"""
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            self._worker_pids.pop(executor, None)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def render(self, plot: Plots, **data) -> bytes:
+        """
+        Draws a plot in a worker
+
+        Parameters
+        ----------
+        plot : Plots
+            Which plot to draw
+        data
+            The keyword arguments of the plot's drawing function,
+            see RENDERERS. These must be picklable
+
+        Returns
+        -------
+        bytes
+            The plot as a PNG
+
+        Raises
+        ------
+        RenderTimeout
+            The plot didn't finish within the timeout
+        """
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor, _render, plot, data)
+        try:
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            log.warning("Rendering %s timed out, restarting workers", plot.name)
+            self._discard(executor)
+            raise RenderTimeout(plot, self.timeout) from None
+        except BrokenProcessPool:
+            # A worker died, start afresh for the next plot
+            self._discard(executor)
+            raise
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            pids = self._context.SimpleQueue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=self._context,
+                initializer=_warm,
+                initargs=(pids,),
+            )
+            self._worker_pids[self._executor] = pids
+
+        return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        if self._executor is executor:
+            self._executor = None
+
+        pids = self._worker_pids.pop(executor, None)
+        executor.shutdown(wait=False, cancel_futures=True)
+        if pids is None:
+            # Already discarded by another render
+            return
+
+        # shutdown doesn't stop running work, so end the processes outright
+        while not pids.empty():
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pids.get(), signal.SIGTERM)
+
+
+def _warm(pids) -> None:
+    """Runs as each worker starts, so the first plot doesn't pay for imports"""
+    pids.put(os.getpid())
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+    import matplotlib.pyplot  # noqa: F401
+    import seaborn  # noqa: F401
+
+
+def _ping() -> None:
+    pass
+
+
+def _render(plot: Plots, data: dict) -> bytes:
+    from matplotlib import pyplot as plt
+
+    figure = plt.figure()
+    try:
+        RENDERERS[plot](**data)
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format="png")
+        return buffer.getvalue()
+    finally:
+        plt.close(figure)
+
+
+def _annotated_scatter(
+    x: Sequence[float],
+    y: Sequence[float],
+    labels: Sequence[str],
+    label_offset: float,
+) -> None:
+    from matplotlib import pyplot as plt
+
+    plt.plot(x, y, "o", color="black")
+    for label, x_value, y_value in zip(labels, x, y):
+        plt.annotate(label, (x_value + label_offset, y_value))
+
+
+def draw_helper_convos_vs_convo_length(
+    total_conversations: Sequence[int],
+    mean_messages: Sequence[float],
+    names: Sequence[str],
+    label_offset: float,
+) -> None:
+    from matplotlib import pyplot as plt
+
+    _annotated_scatter(total_conversations, mean_messages, names, label_offset)
+    plt.xlabel("Total Support Conversations")
+    plt.ylabel("Average Messages Per Conversation")
+    plt.title("Total Support Conversations x Average Messages Per Convo")
+
+
+def draw_helper_convo_time_vs_convo_length(
+    total_conversations: Sequence[int],
+    average_times: Sequence[float],
+    names: Sequence[str],
+    label_offset: float,
+) -> None:
+    from matplotlib import pyplot as plt
+
+    _annotated_scatter(total_conversations, average_times, names, label_offset)
+    plt.ylabel("Average conversation length (Minutes)")
+    plt.xlabel("Average Messages Per Conversation")
+    plt.title("Total Support Conversations x Average convo length")
+
+
+def draw_average_support_response_time(response_times: np.ndarray) -> None:
+    import seaborn as sns
+    from matplotlib import pyplot as plt, ticker
+
+    with sns.axes_style("whitegrid"):
+        ax = sns.histplot(data=response_times, bins=200)
+
+    ax.xaxis.set_major_locator(ticker.MultipleLocator(10))
+    ax.yaxis.set_major_locator(ticker.MultipleLocator(150))
+
+    plt.xlabel("Average support response time (Minutes)")
+    plt.ylabel("Conversations")
+    plt.title("Average time taken to respond to support queries")
+
+
+def draw_timed_scatter(
+    minutes: Sequence[float], messages: Sequence[int]
+) -> None:
+    from matplotlib import pyplot as plt
+
+    plt.plot(minutes, messages, "o", color="black")
+    plt.xlabel("Time (Minutes)")
+    plt.ylabel("Messages (Per conversations)")
+    plt.title("Time x Messages in #support")
+
+
+# Maps each plot to the function which draws it onto the current figure
+RENDERERS: Dict[Plots, Callable[..., None]] = {
+    Plots.HELPER_CONVOS_VS_CONVO_LENGTH: draw_helper_convos_vs_convo_length,
+    Plots.HELPER_CONVO_TIME_VS_CONVO_LENGTH: draw_helper_convo_time_vs_convo_length,
+    Plots.AVERAGE_SUPPORT_RESPONSE_TIME: draw_average_support_response_time,
+    Plots.TIMED_SCATTER: draw_timed_scatter,
+}
@@ -0,0 +1,167 @@
+import datetime
+from typing import Callable, Dict, Optional
+
+import discord
+
+from conversations import Conversation, Message, Helper
+from conversations.deltas import HelperDeltaBuffer
+
+
+class Segmenter:
+    """
+    Splits a channel's messages into support conversations,
+    one message at a time and in the order they were sent.
+
+    A conversation starts with the first message from someone
+    who isn't a helper, and ends as soon as somebody else who
+    isn't a helper speaks. Bot and empty messages are ignored.
+
+    If an idle timeout is given, a conversation also ends
+    once nobody has spoken in it for that long.
+
+    Conversations are only given an identifier once sealed,
+    so an open conversation can be persisted and restored
+    without reserving one.
+
+    Everything credited to helpers is also recorded in
+    ``deltas``, for callers to persist with their checkpoints.
+    """
+
+    def __init__(
+        self,
+        helpers: Dict[int, Helper],
+        next_identifier: Callable[[], int],
+        *,
+        conversation: Optional[Conversation] = None,
+        current_helpers: Optional[Dict[int, int]] = None,
+        idle_timeout: Optional[datetime.timedelta] = None,
+    ):
+        self.helpers = helpers
+        self.next_identifier = next_identifier
+        self.idle_timeout = idle_timeout
+
+        # The open conversation, and how many messages
+        # each helper has sent in it so far
+        self.conversation: Optional[Conversation] = conversation
+        self.current_helpers: Dict[int, int] = current_helpers or {}
+
+        self.deltas = HelperDeltaBuffer()
+
+    def feed(self, message: discord.Message) -> Optional[Conversation]:
+        """
+        Processes the next message in the channel
+
+        Parameters
+        ----------
+        message : discord.Message
+            The message to process
+
+        Returns
+        -------
+        Optional[Conversation]
+            The conversation this message sealed, if any
+        """
+        sealed = self.seal_if_idle(message.created_at)
+        is_helper = message.author.id in self.helpers
+        counts = bool(message.content) and not message.author.bot
+
+        if counts and not is_helper:
+            if not self.conversation:
+                self._start(message)
+
+            elif message.author.id != self.conversation.user_being_helped:
+                sealed = self.seal()
+                self._start(message)
+
+        if is_helper:
+            self.helpers[message.author.id].total_messages += 1
+            self.deltas.add_message(message.author.id)
+
+            if self.conversation:
+                if message.author.id not in self.current_helpers:
+                    self.current_helpers[message.author.id] = 0
+
+                self.current_helpers[message.author.id] += 1
+
+        if not counts or not self.conversation:
+            """
+            Skip the following:
+             - Messages from bots
+             - Messages with no content
+             - Helper messages before anyone has asked for help
+            """
+            return sealed
+
+        self.conversation.messages.append(
+            Message(
+                message.author.id,
+                message.channel.id,
+                message.clean_content,
+                message.guild.id,
+                message.id,
+                message.created_at,
+                is_helper=is_helper,
+            )
+        )
+
+        self.conversation.last_message_id = message.id
+        self.conversation.end_time = message.created_at
+
+        return sealed
+
+    def seal(self) -> Optional[Conversation]:
+        """
+        Ends the open conversation, crediting its helpers
+        and giving it an identifier
+
+        Returns
+        -------
+        Optional[Conversation]
+            The sealed conversation, if one was open
+        """
+        conversation = self.conversation
+        if not conversation:
+            return None
+
+        length = conversation.end_time - conversation.start_time
+        for helper_id, msg_count in self.current_helpers.items():
+            self.helpers[helper_id].conversation_length.append(length)
+            self.helpers[helper_id].messages_per_conversation.append(msg_count)
+            self.helpers[helper_id].total_conversations += 1
+            self.deltas.add_conversation(helper_id, msg_count, length)
+
+        conversation.identifier = self.next_identifier()
+
+        self.conversation = None
+        self.current_helpers = {}
+
+        return conversation
+
+    def seal_if_idle(self, now: datetime.datetime) -> Optional[Conversation]:
+        """
+        Seals the open conversation if nobody has spoken
+        in it for longer than the idle timeout as of ``now``
+
+        Returns
+        -------
+        Optional[Conversation]
+            The sealed conversation, if it was idle
+        """
+        if (
+            self.idle_timeout is None
+            or not self.conversation
+            or now - self.conversation.end_time <= self.idle_timeout
+        ):
+            return None
+
+        return self.seal()
+
+    def _start(self, message: discord.Message) -> None:
+        self.conversation = Conversation(
+            message.id,
+            message.author.id,
+            start_time=message.created_at,
+            channel_id=message.channel.id,
+            guild_id=message.guild.id,
+            identifier=None,
+        )
@@ -0,0 +1,303 @@
+import asyncio
+import datetime
+import logging
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+import attr
+import discord
+
+from conversations import Conversation, Checkpoint, HelperDelta
+from conversations.segmenter import Segmenter
+
+if TYPE_CHECKING:
+    from conversations import Manager
+
+log = logging.getLogger(__name__)
+
+
+class LiveTracker:
+    """
+    Segments messages into conversations as they are sent,
+    using the same rules as a backfill plus an idle timeout.
+
+    Open conversations are kept in memory per channel, while
+    sealed ones are written to the datastore in batches along
+    with a checkpoint, so backfills and restarts carry on from
+    exactly where live tracking got to.
+    """
+
+    def __init__(
+        self,
+        manager: "Manager",
+        *,
+        idle_timeout: datetime.timedelta = datetime.timedelta(minutes=30),
+        flush_interval: float = 60,
+        batch_size: int = 50,
+    ):
+        self.manager = manager
+        self.idle_timeout = idle_timeout
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self.segmenters: Dict[int, Segmenter] = {}
+        self.last_message_ids: Dict[int, int] = {}
+
+        # Sealed conversations waiting to be written
+        self.pending: List[Conversation] = []
+
+        # Messages received for channels which are being
+        # backfilled, replayed once the backfill is done
+        self._paused: Dict[int, List[discord.Message]] = {}
+
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Flushes started by process, kept so they aren't garbage collected
+        self._flushes: Set[asyncio.Task] = set()
+
+    def is_tracking(self, channel_id: int) -> bool:
+        return channel_id in self.segmenters or channel_id in self._paused
+
+    async def track(self, channel: discord.TextChannel) -> None:
+        """
+        Starts tracking a channel, first backfilling everything
+        sent since the last checkpoint when the datastore has them.
+
+        A channel without a checkpoint has never been backfilled, so
+        its whole history is backfilled first. Otherwise the checkpoints
+        written by live tracking would skip over that history for good.
+        For the same reason, the channel isn't tracked if the backfill fails
+        """
+        if self.is_tracking(channel.id):
+            return
+
+        # Buffer from now on so nothing sent during the catch up is missed
+        self._paused[channel.id] = []
+        try:
+            await self.manager._initialize()
+            if await self._supports_checkpoints(channel.id):
+                await self.manager.build_past_conversations(channel)
+        except BaseException:
+            del self._paused[channel.id]
+            raise
+
+        await self.resume(channel.id)
+
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def process(self, message: discord.Message) -> None:
+        """Feeds a newly sent message through its channel's segmenter"""
+        channel_id = message.channel.id
+        if channel_id in self._paused:
+            self._paused[channel_id].append(message)
+            return
+
+        if channel_id not in self.segmenters:
+            return
+
+        self._feed(channel_id, message)
+        if len(self.pending) >= self.batch_size:
+            task = asyncio.create_task(self._flush_logged())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def pause(self, channel_id: int) -> bool:
+        """
+        Writes out a tracked channel's state and buffers its
+        messages until :meth:`resume`, so a backfill can
+        safely take over its checkpoint. If the write fails
+        the channel carries on being tracked
+
+        Returns
+        -------
+        bool
+            Whether the channel was paused by this call
+        """
+        if channel_id not in self.segmenters or channel_id in self._paused:
+            return False
+
+        # The segmenter stays put until it's written, so a failed
+        # write can hand its deltas back to it
+        self._paused[channel_id] = []
+        snapshot = self._snapshot(channel_id, self.segmenters[channel_id])
+        try:
+            await self._write(self._take_pending(), [snapshot] if snapshot else [])
+        except Exception:
+            for message in self._paused.pop(channel_id):
+                self._feed(channel_id, message)
+            raise
+
+        del self.segmenters[channel_id]
+        return True
+
+    async def resume(self, channel_id: int) -> None:
+        """
+        Rebuilds a paused channel's state from its checkpoint
+        and replays the messages sent while it was paused
+        """
+        checkpoint = await self.manager._fetch_checkpoint(channel_id)
+        if checkpoint:
+            self.last_message_ids[channel_id] = checkpoint.last_message_id
+            segmenter = Segmenter(
+                self.manager.helpers,
+                self.manager.get_next_conversation_id,
+                conversation=checkpoint.conversation,
+                current_helpers=checkpoint.current_helpers,
+                idle_timeout=self.idle_timeout,
+            )
+        else:
+            segmenter = Segmenter(
+                self.manager.helpers,
+                self.manager.get_next_conversation_id,
+                idle_timeout=self.idle_timeout,
+            )
+
+        self.segmenters[channel_id] = segmenter
+        for message in self._paused.pop(channel_id, []):
+            self._feed(channel_id, message)
+
+    async def flush(self, *, seal_open: bool = False) -> bool:
+        """
+        Seals idle conversations, then writes every sealed
+        conversation followed by a checkpoint per channel
+
+        Parameters
+        ----------
+        seal_open : bool
+            Also seal conversations which are still going
+
+        Returns
+        -------
+        bool
+            False if the datastore doesn't support checkpoints
+        """
+        snapshots = [
+            self._snapshot(channel_id, segmenter, seal_open=seal_open)
+            for channel_id, segmenter in self.segmenters.items()
+        ]
+        return await self._write(self._take_pending(), [s for s in snapshots if s])
+
+    async def close(self) -> None:
+        """Stops the flush loop and writes out everything in memory"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+
+        if not await self.flush():
+            # Without checkpoints, open conversations would be lost
+            await self.flush(seal_open=True)
+
+    async def _supports_checkpoints(self, channel_id: int) -> bool:
+        try:
+            await self.manager.datastore.fetch_checkpoint(channel_id)
+        except NotImplementedError:
+            return False
+
+        return True
+
+    def _feed(self, channel_id: int, message: discord.Message) -> None:
+        if message.id <= self.last_message_ids.get(channel_id, 0):
+            # A backfill already got to this one
+            return
+
+        self.last_message_ids[channel_id] = message.id
+        conversation = self.segmenters[channel_id].feed(message)
+        if conversation:
+            self.pending.append(conversation)
+
+    def _snapshot(
+        self, channel_id: int, segmenter: Segmenter, *, seal_open: bool = False
+    ) -> Optional[Tuple[Checkpoint, List[HelperDelta]]]:
+        """
+        Seals the channel's conversation if it is idle, or if asked to,
+        and returns a checkpoint of the channel as it is right now
+        along with the helper deltas leading up to it
+        """
+        if seal_open:
+            conversation = segmenter.seal()
+        else:
+            conversation = segmenter.seal_if_idle(datetime.datetime.utcnow())
+
+        if conversation:
+            self.pending.append(conversation)
+
+        if channel_id not in self.last_message_ids:
+            return None
+
+        # The open conversation keeps growing while
+        # we wait on the datastore, so copy it
+        open_conversation = segmenter.conversation
+        if open_conversation:
+            open_conversation = attr.evolve(
+                open_conversation, messages=list(open_conversation.messages)
+            )
+
+        checkpoint = Checkpoint(
+            channel_id,
+            self.last_message_ids[channel_id],
+            open_conversation,
+            dict(segmenter.current_helpers),
+        )
+        return checkpoint, segmenter.deltas.drain()
+
+    def _take_pending(self) -> List[Conversation]:
+        # Taken alongside the checkpoints, so a checkpoint is
+        # never written without the conversations sealed before it
+        pending, self.pending = self.pending, []
+        return pending
+
+    async def _write(
+        self,
+        conversations: List[Conversation],
+        snapshots: List[Tuple[Checkpoint, List[HelperDelta]]],
+    ) -> bool:
+        """
+        Writes conversations then checkpoints. If anything fails, whatever
+        wasn't written is put back to be retried by the next flush
+        """
+        async with self._flush_lock:
+            try:
+                if conversations:
+                    await self.manager.datastore.save_conversations(conversations)
+            except Exception:
+                self._restore(conversations, snapshots)
+                raise
+
+            stored = True
+            for index, (checkpoint, deltas) in enumerate(snapshots):
+                try:
+                    stored = (
+                        await self.manager._store_checkpoint(checkpoint, deltas)
+                        and stored
+                    )
+                except Exception:
+                    self._restore([], snapshots[index:])
+                    raise
+
+            return stored
+
+    def _restore(
+        self,
+        conversations: List[Conversation],
+        snapshots: List[Tuple[Checkpoint, List[HelperDelta]]],
+    ) -> None:
+        # Saving a conversation twice is harmless, they're
+        # recognised by their first message
+        self.pending[:0] = conversations
+        for checkpoint, deltas in snapshots:
+            segmenter = self.segmenters.get(checkpoint.channel_id)
+            if segmenter is not None:
+                segmenter.deltas.restore(deltas)
+
+    async def _flush_logged(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            log.exception("Failed to flush live conversations")
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_logged()
@@ -39,6 +39,8 @@ bot.datastore = ApiStore()
 # bot.datastore = Mongo(MONGO_URL)
 # bot.datastore = Sqlite()
 bot.manager = Manager(bot.datastore)
+# Channels whose conversations are tracked live
+bot.support_channel_ids = (602327123767590992,)
 
 bot.internal_helpers = (
     203104843479515136,
@@ -1,3 +1,5 @@
+import asyncio
+import contextlib
 import re
 from typing import Union
 
@@ -25,6 +27,9 @@ class StatBot(commands.Bot):
         self.db = self.mongo["localized_stats"]
         self.command_usage = Document(self.db, "command_usage")
 
+        # Kept so they aren't garbage collected while they run
+        self._track_tasks = set()
+
     async def get_prefix(self, message):
         prefix = self.PREFIX
         if message.content.casefold().startswith(prefix.casefold()):
@@ -35,14 +40,55 @@ class StatBot(commands.Bot):
 
         return commands.when_mentioned_or(prefix)(self, message)
 
+    async def start(self, *args, **kwargs):
+        """Opens the bot's datastore and plot workers before connecting to discord"""
+        datastore = getattr(self, "datastore", None)
+        if datastore is not None:
+            await datastore.open()
+
+        manager = getattr(self, "manager", None)
+        if manager is not None:
+            await manager.renderer.start()
+
+        await super().start(*args, **kwargs)
+
+    async def close(self):
+        """Closes the bot's datastore alongside the discord connection"""
+        # Callbacks run last to first, each even if an earlier one raised
+        async with contextlib.AsyncExitStack() as stack:
+            stack.push_async_callback(super().close)
+
+            datastore = getattr(self, "datastore", None)
+            if datastore is not None:
+                stack.push_async_callback(datastore.close)
+
+            manager = getattr(self, "manager", None)
+            if manager is not None:
+                stack.push_async_callback(manager.wait_for_archives)
+                stack.callback(manager.renderer.close)
+                # Write out live conversations while the datastore is still open
+                await manager.tracker.close()
+
     async def on_ready(self):
         print(f"{self.__class__.__name__}: Ready")
 
+        manager = getattr(self, "manager", None)
+        for channel_id in getattr(self, "support_channel_ids", ()):
+            channel = self.get_channel(channel_id)
+            if manager is not None and channel is not None:
+                task = asyncio.create_task(manager.tracker.track(channel))
+                self._track_tasks.add(task)
+                task.add_done_callback(self._track_tasks.discard)
+
     async def on_message(self, message):
         # Ignore messages sent by bots
         if message.author.bot:
             return
 
+        manager = getattr(self, "manager", None)
+        if manager is not None:
+            manager.tracker.process(message)
+
         if match := self.mention.match(message.content):
             if int(match.group("id")) == self.user.id:
                 await message.channel.send(